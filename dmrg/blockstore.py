@@ -0,0 +1,147 @@
+'''
+stores for the renormalized blocks of the dmrg engine
+
+a store is used as a stack:append a new block,read the top ones with negative indices,pop the top.
+the i-th stored block of a side is the block of length i+1.
+'''
+import os,shutil,tempfile,threading
+from collections import OrderedDict
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+class BlockStore(object):
+	'''
+	in-memory block store,keeps every block
+	construct:BlockStore(side)
+	'''
+	def __init__(self,side):
+		self.side=side
+		self.blocks=[]
+
+	def __len__(self):
+		return len(self.blocks)
+
+	def __getitem__(self,i):
+		return self.blocks[i]
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def append(self,block):
+		self.blocks.append(block)
+
+	def pop(self,i=-1):
+		return self.blocks.pop(i)
+
+	def close(self):
+		pass
+
+class DiskBlockStore(BlockStore):
+	'''
+	block store that spills to disk,only the cache most recently used blocks stay in memory
+	construct:DiskBlockStore(side,path=None,cache=3,prefetch=True)
+
+	blocks are pickled to path/<side><length>.pkl when evicted from the cache.after a pop the next
+	blocks in the sweep direction(the new top ones) are loaded on a background thread.
+	'''
+	def __init__(self,side,path=None,cache=3,prefetch=True):
+		self.side=side
+		self.own_path=path is None
+		self.path=tempfile.mkdtemp(prefix='dmrg_%s_'%side) if path is None else path
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path)
+		self.cache_size=max(cache,2)
+		self.prefetch=prefetch
+		self.n=0
+		self.cache=OrderedDict() #index->block,least recently used first
+		self.on_disk=set()
+		self.lock=threading.Lock()
+		self.thread=None
+
+	def __len__(self):
+		return self.n
+
+	def fname(self,i):
+		return os.path.join(self.path,'%s%d.pkl'%(self.side,i+1))
+
+	def __getitem__(self,i):
+		if isinstance(i,slice):
+			return [self[j] for j in range(*i.indices(self.n))]
+		if i<0:
+			i+=self.n
+		if not 0<=i<self.n:
+			raise IndexError('block store index out of range')
+		with self.lock:
+			if i in self.cache:
+				block=self.cache.pop(i)
+				self.cache[i]=block
+				return block
+		block=self.load(i)
+		with self.lock:
+			self.insert(i,block)
+		return block
+
+	def load(self,i):
+		with open(self.fname(i),'rb') as f:
+			return pickle.load(f)
+
+	def insert(self,i,block): #call with the lock held
+		self.cache.pop(i,None)
+		self.cache[i]=block
+		while len(self.cache)>self.cache_size:
+			j,old=self.cache.popitem(last=False)
+			if j not in self.on_disk:
+				with open(self.fname(j),'wb') as f:
+					pickle.dump(old,f,pickle.HIGHEST_PROTOCOL)
+				self.on_disk.add(j)
+
+	def wait(self):
+		if self.thread is not None:
+			self.thread.join()
+			self.thread=None
+
+	def append(self,block):
+		self.wait()
+		with self.lock:
+			self.insert(self.n,block)
+			self.n+=1
+
+	def pop(self,i=-1):
+		assert(i in (-1,self.n-1)) #stack only
+		self.wait()
+		block=self[-1]
+		with self.lock:
+			self.n-=1
+			self.cache.pop(self.n,None)
+			if self.n in self.on_disk:
+				os.remove(self.fname(self.n))
+				self.on_disk.discard(self.n)
+		if self.prefetch and self.n>0:
+			self.thread=threading.Thread(target=self.fetch,args=([j for j in (self.n-1,self.n-2) if j>=0],))
+			self.thread.daemon=True
+			self.thread.start()
+		return block
+
+	def fetch(self,indices):
+		for i in indices:
+			with self.lock:
+				if i in self.cache:
+					continue
+			block=self.load(i)
+			with self.lock:
+				if i<self.n:
+					self.insert(i,block)
+
+	def close(self):
+		self.wait()
+		self.cache.clear()
+		if self.own_path:
+			shutil.rmtree(self.path,ignore_errors=True)
+		else:
+			for i in self.on_disk:
+				os.remove(self.fname(i))
+		self.on_disk.clear()
+		self.n=0
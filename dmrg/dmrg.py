@@ -2,158 +2,420 @@
 dmrg engine
 '''
 import numpy as np
-from copy import copy,deepcopy
+import os,time,gzip
+from copy import copy
+from contextlib import contextmanager
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+from multiprocessing.pool import ThreadPool
 
-from superblock import SuperBlock
+from superblock import SuperBlock,IndexCache,mixed_truncate,idmrg_guess
 from mps import MPS
+from blockstore import BlockStore
+from eigsolve import EigenSolver
+from schedule import SweepSchedule
+from observer import PrintObserver
 
 class DMRGEngine(object):
 	'''
 	dmrg engine
-	construct:DMRGEngine(lhgen,rhgen)
+	construct:DMRGEngine(lhgen,rhgen,blockstore=BlockStore,solver=None,targets=None,observers=None,index_cache_size=None)
+	close() or a with statement releases the block stores,the observers and the thread pool
 	
 	attributes:
 	lhgen:left hamiltonian generator
 	rhgen:right hamiltonian generator
 	N:length of whole chain
-	lblocks:a list to store left generators
-	rblocks:a list to store right generators
-	sblock:super block	
+	lblocks:a block store(stack) of left generators,see blockstore.py
+	rblocks:a block store(stack) of right generators
+	sblock:super block of the first target
+	sblocks:super blocks of all targets
+	solver:eigensolver of the superblock,an EigenSolver
+	sweep:index of the current sweep,0 for the infinite warmup
+	warmup:whether the infinite warmup of finite runs,only its solves have the early_maxiter cap of the solver
+	trunc_err:discarded weight of the last truncation
+	sweep_tol:eigensolver tolerance of the current sweep from the schedule,None for the default of the solver
+	targets:list of (sector,k),the k lowest states of each sector are targeted,default [(0.,1)]
+	energies:{sector:energies of the k lowest states} of the last step
+	phase:position in the current sweep,0:towards the right end,1:towards the left end,2:back to the middle
+	sweep_energies,sweep_errs:energies and largest discarded weight at the end of every finished sweep
+	observers:observers of the steps and sweeps,see observer.py,default [PrintObserver()]
+	nstep:number of finished steps
+	psis:the states of the last step as sparse (D_L,D_R) matrices,one list per target
+	converged:whether the sweeps of the schedule converged
+	bond_energies:energy per site of the bonds added in every step of idmrg
+	timings:wall times of the parts of the current step
+	index_cache:IndexCache of the restricted superblock indices,index_cache_size entries,default 2L per target
+
+	with several targeted states the blocks are truncated with the density matrix mixed over all of them
+	and the sectors are solved concurrently in a thread pool.
 	'''
-	def __init__(self,lhgen,rhgen):
-		self.lhgen=lhgen
-		self.rhgen=rhgen
+	def __init__(self,lhgen,rhgen,blockstore=BlockStore,solver=None,targets=None,observers=None,index_cache_size=None):
+		self.lhgen=copy(lhgen)
+		self.rhgen=copy(rhgen)
 		self.L=self.rhgen.L
-		self.lblocks=[deepcopy(self.lhgen)]
-		self.rblocks=[deepcopy(self.rhgen)]
+		self.lblocks=blockstore('l')
+		self.rblocks=blockstore('r')
+		self.lblocks.append(copy(self.lhgen)) #hgens are copy-on-write,the stacks only hold references
+		self.rblocks.append(copy(self.rhgen))
 		self.d=self.lhgen.d
+		self.solver=EigenSolver() if solver is None else solver
+		self.sweep=0
+		self.warmup=False
+		self.trunc_err=0.
+		self.sweep_tol=None
+		self.targets=[(0.,1)] if targets is None else list(targets)
+		self.energies={}
+		self.pool=None
+		self.phase=0
+		self.sweep_energies=[]
+		self.sweep_errs=[]
+		self.max_err=0.
+		self.converged=False
+		self.observers=[PrintObserver()] if observers is None else list(observers)
+		self.nstep=0
+		self.timings={}
+		self.index_cache_size=2*self.L*len(self.targets) if index_cache_size is None else index_cache_size
+		self.index_cache=IndexCache(self.index_cache_size)
+
+	@contextmanager
+	def timer(self,name):
+		'''add the wall time of a block of code to the timings of the current step'''
+		t0=time.time()
+		yield
+		self.timings[name]=self.timings.get(name,0.)+time.time()-t0
+
+	def notify(self,event,*args):
+		for observer in self.observers:
+			getattr(observer,event)(self,*args)
+
+	def begin_step(self):
+		self.timings=dict((name,0.) for name in ['enlarge','build','eigensolve','truncate','transform'])
+		self.notify('start')
+
+	def end_step(self,direction,m,**extra):
+		'''send the record of the finished step(with the extra fields) to the observers'''
+		infos=[sblock.info for sblock in self.sblocks]
+		record={'step':self.nstep,'sweep':self.sweep,'direction':direction,'site':self.sblock.lhgen.l,
+			'length':self.sblock.L,'m':m,'DL':self.sblock.lhgen.D,'DR':self.sblock.rhgen.D,
+			'kept':[self.lhgen.D,self.rhgen.D],'energy':float(self.sblock.energies[0]),
+			'energies':[(sblock.target_sector,[float(E) for E in sblock.energies]) for sblock in self.sblocks],
+			'trunc_err':float(self.trunc_err),'niter':sum(info['niter'] for info in infos),
+			'nmatvec':sum(info['nmatvec'] for info in infos),'tol':self.sblock.info['tol'],
+			'overlap':[float(overlap) for overlap in self.sblock.info['overlap']],'time':self.timings}
+		record.update(extra)
+		self.nstep+=1
+		self.notify('step',record)
+
+	def close(self):
+		'''close the observers,the thread pool of the targets and both block stores(removes their files)'''
+		self.notify('close')
+		self.lblocks.close()
+		self.rblocks.close()
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool=None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*exc):
+		self.close()
+
+	def solve(self,guesses=None):
+		'''
+		build the superblocks of the enlarged lhgen,rhgen for all targets and find their lowest states
+		guesses:a list with the guess(or list of guesses) of every target
+		'''
+		if guesses is None:
+			guesses=[None]*len(self.targets)
+		with self.timer('build'):
+			self.sblocks=[SuperBlock(self.lhgen,self.rhgen,sector,index_cache=self.index_cache) for sector,k in self.targets]
+		def eigen(i):
+			sweep=self.sweep if self.sweep>0 or self.warmup else None #standalone infinite/idmrg runs are not capped
+			return self.sblocks[i].eigen(guesses[i],self.solver,sweep,self.trunc_err,self.targets[i][1],self.sweep_tol)
+		with self.timer('eigensolve'):
+			if len(self.sblocks)==1:
+				eigen(0)
+			else:
+				if self.pool is None:
+					self.pool=ThreadPool(len(self.targets))
+				self.pool.map(eigen,range(len(self.sblocks)))
+		self.sblock=self.sblocks[0]
+		self.energies=dict((sblock.target_sector,sblock.energies) for sblock in self.sblocks)
+		self.psis=[[sblock.psi_matrix(i) for i in range(len(sblock.restricted_psis))] for sblock in self.sblocks]
+		return self.sblock.energies[0]
+
+	def truncate(self,m,noise=0.,max_trunc=0.):
+		'''
+		truncation of the enlarged blocks to m states,returns U,S,V
+		noise:strength of the density matrix perturbation
+		max_trunc:keep fewer than m states if the discarded weight stays below max_trunc
+		'''
+		with self.timer('truncate'):
+			if len(self.sblocks)==1 and len(self.sblock.restricted_psis)==1 and noise==0.:
+				U,S,V=self.sblock.truncate(m,max_trunc)
+			else:
+				U,S,V=mixed_truncate(self.sblocks,m,noise,max_trunc)
+		self.s=S
+		self.trunc_err=self.sblock.discarded_weight
+		self.max_err=max(self.max_err,self.trunc_err)
+		return U,S,V
+
+	def transform(self,U,V=None):
+		'''transform the enlarged left block with U and the right one with V(if given)'''
+		with self.timer('transform'):
+			self.lhgen.U=U
+			self.lhgen.transform(U)
+			self.lhgen.basis_sector_array=self.sblock.new_sector_array
+			self.lhgen.basis_by_sector=self.sblock.new_basis_by_sector
+			if V is not None:
+				self.rhgen.V=V
+				self.rhgen.transform(V)
+				self.rhgen.basis_sector_array=self.sblock.rnew_sector_array
+				self.rhgen.basis_by_sector=self.sblock.rnew_basis_by_sector
+
+	def update(self,m,noise=0.,max_trunc=0.):
+		'''truncate the enlarged blocks to m states and push them to the block stores,see truncate'''
+		U,S,V=self.truncate(m,noise,max_trunc)
+		self.transform(U,V)
+		with self.timer('transform'):
+			self.lblocks.append(copy(self.lhgen))
+			self.rblocks.append(copy(self.rhgen))
+
+	def guesses(self,move):
+		'''carry all states of the last step to the next step,move maps a sparse wavefunction'''
+		return [[move(psi) for psi in psis] for psis in self.psis]
 	
 	def single_step(self,m): #only for infinite
 		'''single dmrg step.m:number of kept states'''
-		self.lhgen.enlarge()
-		self.rhgen.enlarge()
-		self.sblock=SuperBlock(self.lhgen,self.rhgen,joint=True)
-		E,psi=self.sblock.eigen()
-		print '*'*(self.lhgen.l-1)+'++'+'*'*(self.rhgen.l-1)
-		print 'E=',float(E)/self.sblock.L
-
-		U=self.sblock.transmat(m);self.lhgen.U=U
-		self.lhgen.transform(U)
-		V=self.sblock.rtransmat(m);self.rhgen.V=V
-		self.rhgen.transform(V)
-		self.lhgen.basis_sector_array=self.sblock.new_sector_array
-		self.lhgen.basis_by_sector=self.sblock.new_basis_by_sector
-		self.rhgen.basis_sector_array=self.sblock.rnew_sector_array
-		self.rhgen.basis_by_sector=self.sblock.rnew_basis_by_sector
-
-		self.lblocks.append(deepcopy(self.lhgen))
-		self.rblocks.append(deepcopy(self.rhgen))
+		self.begin_step()
+		with self.timer('enlarge'):
+			self.lhgen.enlarge()
+			self.rhgen.enlarge()
+		self.solve()
+		self.update(m)
+		self.end_step('infinite',m)
 
 	def infinite(self,m):
 		'''infinite algorithm'''
-		for i in range(self.L/2-1):
+		while len(self.lblocks)<self.L/2:
 			self.single_step(m)
+
+	def idmrg(self,m,tol=1e-8,maxstep=200,mirror=None):
+		'''
+		infinite dmrg:grow the chain by two sites per step until the energy per site of the added bonds
+		changes by less than tol,the blocks are not pushed to the block stores.
+		mirror:use the mirrored left block as the right block instead of enlarging and transforming
+		the right block,by default if the model is reflection symmetric(see HGen.reflection)
+		the wavefunction of every step is predicted from the last two steps,see idmrg_guess.
+		returns the energy per site of the added bonds
+		'''
+		labels=self.lhgen.reflection()
+		if mirror is None:
+			mirror=labels is not None
+		elif mirror and labels is None:
+			raise ValueError('the model is not reflection symmetric')
+		self.bond_energies=[]
+		E0=0.;centers=[]
+		for step in range(maxstep):
+			self.begin_step()
+			guesses=None
+			if len(centers)==2:
+				guesses=[idmrg_guess(U,U if mirror else V,centers[1],centers[0],self.d,mirror)]+[None]*(len(self.targets)-1)
+			with self.timer('enlarge'):
+				self.lhgen.enlarge()
+				if mirror:
+					self.rhgen=self.lhgen.mirror(labels)
+				else:
+					self.rhgen.enlarge()
+			E=self.solve(guesses)
+			U,S,V=self.truncate(m)
+			if mirror: #the right block is the mirrored left block,V is replaced by U
+				Ud=U.toarray()
+				center=Ud.conjugate().transpose().dot(self.sblock.psi_matrix().toarray()).dot(Ud.conjugate())
+			else:
+				center=np.diag(S)
+			centers=(centers+[center])[-2:]
+			self.transform(U,None if mirror else V)
+			self.bond_energies.append((E-E0)/2)
+			E0=E
+			self.end_step('infinite',m,bond_energy=float(self.bond_energies[-1]))
+			if len(self.bond_energies)>2 and abs(self.bond_energies[-1]-self.bond_energies[-2])<tol:
+				break
+		return self.bond_energies[-1]
+
+	def rmove(self,psi):
+		'''wavefunction(sparse,(lblocks[-2].D*d,D_R)) of the last superblock moved one site to the right'''
+		psi=self.lblocks[-1].U.conjugate().transpose().dot(psi)
+		psi=psi.reshape((-1,self.rblocks[-1].D))
+		return psi.dot(self.rblocks[-1].V.conjugate().transpose())
+
+	def lmove(self,psi):
+		'''wavefunction(sparse,(D_L,rblocks[-2].D*d)) of the last superblock moved one site to the left'''
+		psi=psi.dot(self.rblocks[-1].V)
+		psi=psi.reshape((self.lblocks[-1].D,-1))
+		return self.lblocks[-1].U.dot(psi)
 	
-	def right_sweep(self,m):
+	def right_sweep(self,m,noise=0.,max_trunc=0.):
 		'''sweep one site towards right'''
+		self.begin_step()
 		self.rblocks.pop(-1)
-		psi0_guess=np.reshape(self.sblock.full_psi0,(self.lblocks[-2].D*self.d,-1))
-		psi0_guess=self.lblocks[-1].U.conjugate().transpose().todense().dot(psi0_guess)
-		psi0_guess=psi0_guess.reshape(-1,self.rblocks[-1].D)
-		psi0_guess=psi0_guess.dot(self.rblocks[-1].V.conjugate().transpose().todense())
-		psi0_guess=psi0_guess.reshape(-1,1)
+		guesses=self.guesses(self.rmove)
 		self.rblocks.pop(-1)
-		self.lhgen=deepcopy(self.lblocks[-1])
-		self.rhgen=deepcopy(self.rblocks[-1])
-		self.lhgen.enlarge();self.rhgen.enlarge()
-		self.sblock=SuperBlock(self.lhgen,self.rhgen)
-		E,psi=self.sblock.eigen(psi0_guess)
-		print '-'*(self.lblocks[-1].l)+'++'+'='*(self.rblocks[-1].l)
-		print 'E=',float(E)/self.L
-		
-		U=self.sblock.transmat(m);self.lhgen.U=U
-		V=self.sblock.rtransmat(m);self.rhgen.V=V
-		self.lhgen.transform(U)
-		self.rhgen.transform(V)
-		self.lhgen.basis_sector_array=self.sblock.new_sector_array
-		self.lhgen.basis_by_sector=self.sblock.new_basis_by_sector
-		self.rhgen.basis_sector_array=self.sblock.rnew_sector_array
-		self.rhgen.basis_by_sector=self.sblock.rnew_basis_by_sector
-		self.lblocks.append(deepcopy(self.lhgen))
-		self.rblocks.append(deepcopy(self.rhgen))
-
-	def left_sweep(self,m):
+		with self.timer('enlarge'):
+			self.lhgen=copy(self.lblocks[-1])
+			self.rhgen=copy(self.rblocks[-1])
+			self.lhgen.enlarge();self.rhgen.enlarge()
+		self.solve(guesses)
+		self.update(m,noise,max_trunc)
+		self.end_step('right',m)
+
+	def left_sweep(self,m,noise=0.,max_trunc=0.):
 		'''sweep one site towards left'''
+		self.begin_step()
 		self.lblocks.pop(-1)
-		psi0_guess=np.reshape(self.sblock.full_psi0,(-1,self.rblocks[-2].D*self.d))
-		psi0_guess=psi0_guess.dot(self.rblocks[-1].V.todense())
-		psi0_guess=psi0_guess.reshape(self.lblocks[-1].D,-1)
-		psi0_guess=self.lblocks[-1].U.todense().dot(psi0_guess)
-		psi0_guess=psi0_guess.reshape(-1,1)
+		guesses=self.guesses(self.lmove)
 		self.lblocks.pop(-1)
-		self.lhgen=deepcopy(self.lblocks[-1])
-		self.rhgen=deepcopy(self.rblocks[-1])
-		self.lhgen.enlarge()
-		self.rhgen.enlarge()
-		self.sblock=SuperBlock(self.lhgen,self.rhgen)
-		E,psi=self.sblock.eigen(psi0_guess)
-		print '='*(self.lblocks[-1].l)+'++'+'-'*(self.rblocks[-1].l)
-		print 'E=',float(E)/self.L
-		
-		U=self.sblock.transmat(m);self.lhgen.U=U
-		V=self.sblock.rtransmat(m);self.rhgen.V=V	
-		self.lhgen.transform(U)
-		self.rhgen.transform(V)
-		self.lhgen.basis_sector_array=self.sblock.new_sector_array
-		self.lhgen.basis_by_sector=self.sblock.new_basis_by_sector
-		self.rhgen.basis_sector_array=self.sblock.rnew_sector_array
-		self.rhgen.basis_by_sector=self.sblock.rnew_basis_by_sector
-		self.lblocks.append(deepcopy(self.lhgen))
-		self.rblocks.append(deepcopy(self.rhgen))
-
-	def finite(self,mwarmup,mlist):
-		'''finite algorithm'''
-		self.infinite(mwarmup) #mind the initialize problem
-		for m in mlist:
-			for i in range(self.L/2,self.L-2):
-				self.right_sweep(m)
-			for i in range(1,self.L-3):
-				self.left_sweep(m)
-			for i in range(1,self.L/2-1):
-				self.right_sweep(m)
-		
-	def tomps(self):
-		As=[np.array([[1.,0],[0,1.]])]
-		As[0]=As[0].reshape(-1,2,As[0].shape[-1])
-		Bs=[np.array([[1.,0],[0,1.]])]
-		Bs[0]=Bs[0].reshape(Bs[0].shape[0],2,-1)
-		for lhgen in self.lblocks[1:]:
-			A=copy(lhgen.U)	
-			A=A.toarray()
-			A=A.reshape(-1,2,A.shape[-1])
-			As.append(A)
-		for rhgen in self.rblocks[1:]:
-			B=copy(rhgen.V)
-			B=B.toarray()
-			B=B.conjugate().transpose()
-			B=B.reshape(B.shape[0],2,-1)
-			Bs.append(B)
-		Bs.reverse()
-		S=self.sblock.s
-		
-		return MPS(self.d,self.L,As,Bs,S)
-
-
-
-
-
-
-
-
+		with self.timer('enlarge'):
+			self.lhgen=copy(self.lblocks[-1])
+			self.rhgen=copy(self.rblocks[-1])
+			self.lhgen.enlarge()
+			self.rhgen.enlarge()
+		self.solve(guesses)
+		self.update(m,noise,max_trunc)
+		self.end_step('left',m)
 
+	def full_sweep(self,sweep):
+		'''one sweep to the right end,to the left end and back to the middle,sweep:a Sweep of the schedule'''
+		self.sweep_tol=sweep.tol
+		args=(sweep.m,sweep.noise,sweep.max_trunc)
+		if self.phase==0:
+			while len(self.rblocks)>2:
+				self.right_sweep(*args)
+			self.phase=1
+		if self.phase==1:
+			while len(self.lblocks)>2:
+				self.left_sweep(*args)
+			self.phase=2
+		while len(self.lblocks)<self.L/2:
+			self.right_sweep(*args)
+		self.phase=0
 
+	def finite(self,mwarmup,mlist=None,schedule=None):
+		'''
+		finite algorithm
+		mwarmup:number of kept states of the infinite warmup
+		mlist:number of kept states of every sweep,used if no schedule is given
+		schedule:a SweepSchedule,see schedule.py
+		'''
+		if mlist is None and schedule is None:
+			raise ValueError('finite needs the kept states mlist or a schedule')
+		self.mwarmup=mwarmup
+		self.schedule=SweepSchedule(mlist) if schedule is None else schedule
+		self.run()
 
+	def run(self):
+		'''run the finite algorithm set up by finite from the current position on'''
+		if self.sweep==0:
+			self.warmup=True
+			try:
+				self.infinite(self.mwarmup) #mind the initialize problem
+			finally:
+				self.warmup=False
+		while True:
+			if len(self.sweep_energies)==self.sweep: #start the next sweep
+				if self.converged or self.sweep==len(self.schedule):
+					break
+				self.sweep+=1
+				self.max_err=0.
+			self.full_sweep(self.schedule[self.sweep-1])
+			self.sweep_energies.append(np.concatenate([self.energies[sector] for sector,k in self.targets]))
+			self.sweep_errs.append(self.max_err)
+			self.converged=self.schedule.converged(self.sweep_energies,self.sweep_errs)
+			self.notify('sweep',{'sweep':self.sweep,'energies':[float(E) for E in self.sweep_energies[-1]],
+				'max_err':float(self.max_err),'converged':self.converged})
 
+	transient=['lblocks','rblocks','observers','pool','sblock','sblocks','timings','index_cache']
 
+	def save(self,path):
+		'''
+		write a checkpoint to path:a gzip compressed stream of pickles,the state of the engine followed
+		by the blocks of both stores.the file is written to path.tmp first and then renamed,
+		so path always holds a complete checkpoint.
+		'''
+		state=dict((key,value) for key,value in self.__dict__.items() if key not in self.transient)
+		state['nblocks']=(len(self.lblocks),len(self.rblocks))
+		tmp=path+'.tmp'
+		with open(tmp,'wb') as raw:
+			f=gzip.GzipFile(fileobj=raw,mode='wb',compresslevel=6)
+			pickle.dump(state,f,pickle.HIGHEST_PROTOCOL)
+			for store in (self.lblocks,self.rblocks):
+				for i in range(len(store)):
+					pickle.dump(store[i],f,pickle.HIGHEST_PROTOCOL)
+			f.close()
+			raw.flush()
+			os.fsync(raw.fileno())
+		os.rename(tmp,path)
 
+	@classmethod
+	def load(cls,path,blockstore=BlockStore,observers=None):
+		'''engine restored from a checkpoint written by save'''
+		engine=cls.__new__(cls)
+		f=gzip.open(path,'rb')
+		try:
+			state=pickle.load(f)
+			nl,nr=state.pop('nblocks')
+			engine.__dict__.update(state)
+			engine.lblocks=blockstore('l')
+			engine.rblocks=blockstore('r')
+			for store,n in ((engine.lblocks,nl),(engine.rblocks,nr)):
+				for i in range(n):
+					store.append(pickle.load(f))
+		finally:
+			f.close()
+		engine.observers=[PrintObserver()] if observers is None else list(observers)
+		engine.pool=None
+		engine.timings={}
+		engine.index_cache=IndexCache(engine.index_cache_size)
+		return engine
 
+	@classmethod
+	def resume(cls,path,blockstore=BlockStore,observers=None):
+		'''
+		continue a finite run from a checkpoint,in the middle of a sweep if it was written there.
+		the saved wavefunction is the start vector of the first step.returns the engine
+		'''
+		engine=cls.load(path,blockstore,observers)
+		engine.run()
+		return engine
+		
+	def tomps(self,qns=False):
+		'''
+		the state of the last step as an mps:As from U of the left blocks,Bs from V of the right blocks and
+		the schmidt values S of the center bond.the stores are read one block at a time.
+		qns:attach the quantum numbers,site_qns of the physical index and bond_qns[i],the total
+		sector of the sites left of bond i(i=0...L)
+		'''
+		d=self.d
+		As=[np.identity(d).reshape(1,d,d)]
+		Bs=[np.identity(d).reshape(d,d,1)]
+		lqns=[np.zeros(1),self.lblocks[0].basis_sector_array];rqns=[self.rblocks[0].basis_sector_array]
+		for i in range(1,len(self.lblocks)):
+			lhgen=self.lblocks[i]
+			As.append(lhgen.U.toarray().reshape(-1,d,lhgen.U.shape[1]))
+			lqns.append(lhgen.basis_sector_array)
+		for i in range(1,len(self.rblocks)):
+			rhgen=self.rblocks[i]
+			Bs.append(rhgen.V.transpose().toarray().reshape(rhgen.V.shape[1],d,-1)) #psi=U.S.V^T
+			rqns.append(rhgen.basis_sector_array)
+		Bs.reverse()
+		mps=MPS(d,self.L,As,Bs,self.s)
+		if qns:
+			target=self.targets[0][0]
+			mps.site_qns=self.lhgen.single_site_sectors
+			mps.bond_qns=lqns+[target-q for q in rqns[-2::-1]]+[np.array([target])]
+		return mps
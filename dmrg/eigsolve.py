@@ -0,0 +1,189 @@
+'''
+eigensolvers for the lowest state of the superblock hamiltonian
+
+all solvers take a matvec function and a start vector and return the lowest eigenvalue,
+the normalized eigenvector and an info dict with the number of iterations and matvecs.
+'''
+import time
+import numpy as np
+from scipy.sparse.linalg import eigsh,LinearOperator
+
+def davidson(matvec,v0,diag=None,tol=1e-10,maxiter=200,maxsub=20,locked=None):
+	'''
+	davidson method for the lowest eigenpair
+	diag:diagonal of the matrix,used as preconditioner
+	tol:tolerance of the residual norm
+	maxiter:maximum number of matvecs
+	maxsub:maximum dimension of the search space before restart
+	locked:(n,j) orthonormal vectors the search space is kept orthogonal to
+	'''
+	n=len(v0)
+	V=np.zeros((n,maxsub),dtype=v0.dtype);AV=np.zeros((n,maxsub),dtype=v0.dtype)
+	V[:,0]=v0/np.linalg.norm(v0);AV[:,0]=matvec(V[:,0])
+	k=1;nmatvec=1;niter=0
+	while True:
+		niter+=1
+		T=V[:,:k].conjugate().T.dot(AV[:,:k])
+		theta,S=np.linalg.eigh((T+T.conjugate().T)/2)
+		x=V[:,:k].dot(S[:,0]);Ax=AV[:,:k].dot(S[:,0])
+		r=Ax-theta[0]*x
+		if np.linalg.norm(r)<tol or nmatvec>=maxiter or k>=n:
+			return theta[0],x/np.linalg.norm(x),{'niter':niter,'nmatvec':nmatvec,'residual':np.linalg.norm(r)}
+		if diag is not None:
+			denom=theta[0]-diag
+			denom[np.abs(denom)<1e-8]=1e-8
+			t=r/denom
+		else:
+			t=r
+		if locked is not None:
+			t=t-locked.dot(locked.conjugate().T.dot(t))
+		if k==maxsub: #restart with the current ritz vector
+			V[:,0]=x/np.linalg.norm(x);AV[:,0]=Ax/np.linalg.norm(x);k=1
+		for i in range(2):
+			t-=V[:,:k].dot(V[:,:k].conjugate().T.dot(t))
+		norm=np.linalg.norm(t)
+		if norm<1e-12: #search space exhausted,try the residual
+			t=r-V[:,:k].dot(V[:,:k].conjugate().T.dot(r));norm=np.linalg.norm(t)
+			if norm<1e-12:
+				return theta[0],x/np.linalg.norm(x),{'niter':niter,'nmatvec':nmatvec,'residual':np.linalg.norm(r)}
+		V[:,k]=t/norm;AV[:,k]=matvec(V[:,k])
+		k+=1;nmatvec+=1
+
+def lanczos(matvec,v0,tol=1e-10,maxiter=200,ncv=20,nkeep=3):
+	'''
+	thick-restart lanczos for the lowest eigenpair,with full reorthogonalization
+	tol:tolerance of the residual norm
+	maxiter:maximum number of matvecs
+	ncv:dimension of the krylov space
+	nkeep:number of ritz vectors kept at a restart
+	'''
+	n=len(v0)
+	ncv=min(ncv,n);nkeep=min(nkeep,ncv-1)
+	Q=np.zeros((n,ncv+1),dtype=v0.dtype);T=np.zeros((ncv+1,ncv+1),dtype=v0.dtype)
+	Q[:,0]=v0/np.linalg.norm(v0)
+	k=0;nmatvec=0;niter=0
+	while True:
+		niter+=1
+		m=ncv;beta=0.
+		for j in range(k,ncv):
+			w=matvec(Q[:,j]);nmatvec+=1
+			h=Q[:,:j+1].conjugate().T.dot(w);w=w-Q[:,:j+1].dot(h)
+			h2=Q[:,:j+1].conjugate().T.dot(w);w=w-Q[:,:j+1].dot(h2);h=h+h2
+			T[:j+1,j]=h;T[j,:j+1]=h.conjugate()
+			beta=np.linalg.norm(w)
+			if beta<1e-12: #invariant subspace
+				m=j+1;break
+			Q[:,j+1]=w/beta
+			T[j+1,j]=T[j,j+1]=beta
+			if nmatvec>=maxiter:
+				m=j+1;break
+		theta,S=np.linalg.eigh(T[:m,:m])
+		residual=abs(beta*S[m-1,0])
+		if residual<tol or nmatvec>=maxiter or beta<1e-12 or m<ncv:
+			x=Q[:,:m].dot(S[:,0])
+			return theta[0],x/np.linalg.norm(x),{'niter':niter,'nmatvec':nmatvec,'residual':residual}
+		Q[:,:nkeep]=Q[:,:m].dot(S[:,:nkeep]);Q[:,nkeep]=Q[:,m]
+		T[:]=0.
+		T[:nkeep,:nkeep]=np.diag(theta[:nkeep])
+		T[nkeep,:nkeep]=T[:nkeep,nkeep]=beta*S[m-1,:nkeep]
+		k=nkeep
+
+def arpack(matvec,v0,tol=1e-10,maxiter=200):
+	'''scipy eigsh(arpack),tol is passed to arpack as relative eigenvalue accuracy'''
+	n=len(v0);count=[0]
+	def mv(v):
+		count[0]+=1
+		return matvec(np.ravel(v))
+	E,v=eigsh(LinearOperator((n,n),matvec=mv,dtype=v0.dtype),k=1,which='SA',v0=v0,tol=tol,maxiter=maxiter)
+	return E[0],v[:,0],{'niter':count[0],'nmatvec':count[0],'residual':None}
+
+class EigenSolver(object):
+	'''
+	eigensolver with a convergence aware tolerance
+	construct:EigenSolver(method='davidson',tol=1e-10,tol_factor=1e-2,maxiter=300,early_maxiter=40,nearly=1)
+
+	the tolerance of a step is max(tol,tol_factor*truncation error of the previous step),a tol passed to a call
+	replaces the default tol for that call only.
+	sweeps with index<nearly(the infinite warmup of finite is sweep 0) are capped at early_maxiter matvecs,
+	solves without a sweep(standalone infinite and idmrg) use maxiter.
+	'''
+	def __init__(self,method='davidson',tol=1e-10,tol_factor=1e-2,maxiter=300,early_maxiter=40,nearly=1):
+		self.method=method
+		self.tol=tol
+		self.tol_factor=tol_factor
+		self.maxiter=maxiter
+		self.early_maxiter=early_maxiter
+		self.nearly=nearly
+
+	def params(self,sweep=None,trunc_err=0.,tol=None):
+		tol=max(self.tol if tol is None else tol,self.tol_factor*trunc_err)
+		maxiter=self.early_maxiter if sweep is not None and sweep<self.nearly else self.maxiter
+		return tol,maxiter
+
+	def solve(self,matvec,v0,diag,tol,maxiter,locked=None):
+		if self.method=='davidson':
+			return davidson(matvec,v0,diag,tol,maxiter,locked=locked)
+		elif self.method=='lanczos':
+			return lanczos(matvec,v0,tol,maxiter)
+		else:
+			return arpack(matvec,v0,tol,maxiter)
+
+	def __call__(self,matvec,v0,diag=None,sweep=None,trunc_err=0.,tol=None):
+		tol,maxiter=self.params(sweep,trunc_err,tol)
+		t0=time.time()
+		n=len(v0)
+		if n<=2:
+			H=np.array([matvec(v) for v in np.identity(n)]).T
+			E,v=np.linalg.eigh(H)
+			E,v,info=E[0],v[:,0],{'niter':1,'nmatvec':n,'residual':0.}
+		else:
+			E,v,info=self.solve(matvec,v0,diag,tol,maxiter)
+		info['time']=time.time()-t0
+		info['tol']=tol
+		info['method']=self.method
+		return E,v,info
+
+	def eigs(self,matvec,v0s,diag=None,sweep=None,trunc_err=0.,tol=None):
+		'''
+		the len(v0s) lowest eigenpairs,found one after the other with the operator deflated
+		by the converged lower states.returns the energies,a list of the states and the summed info
+		the lower states are shifted to sigma=R+|R|+1,R the rayleigh quotient of the deflated guess,which is
+		above the wanted eigenvalue,so no solver converges to them(a plain projection gives them eigenvalue 0)
+		'''
+		if len(v0s)==1:
+			E,v,info=self(matvec,v0s[0],diag,sweep,trunc_err,tol)
+			return np.array([E]),[v],info
+		tol,maxiter=self.params(sweep,trunc_err,tol)
+		t0=time.time()
+		n=len(v0s[0]);k=min(len(v0s),n)
+		if n<=k+1:
+			H=np.array([matvec(v) for v in np.identity(n)]).T
+			E,v=np.linalg.eigh(H)
+			Es,vs,info=E[:k],list(v[:,:k].T),{'niter':1,'nmatvec':n,'residual':0.}
+		else:
+			Es,vs,residuals=[],[],[]
+			info={'niter':0,'nmatvec':0}
+			for v0 in v0s[:k]:
+				if vs:
+					locked=np.array(vs).T
+					deflate=lambda v:v-locked.dot(locked.conjugate().T.dot(v))
+					v0=deflate(v0)
+					if np.linalg.norm(v0)<1e-8: #the guess is one of the lower states
+						v0=deflate(np.random.rand(n)-0.5)
+					R=np.vdot(v0,matvec(v0)).real/np.vdot(v0,v0).real
+					info['nmatvec']+=1
+					sigma=R+abs(R)+1.
+					mv=lambda v:deflate(matvec(deflate(v)))+sigma*(v-deflate(v))
+				else:
+					locked=None;mv=matvec
+				E,v,sinfo=self.solve(mv,v0,diag,tol,maxiter,locked)
+				if locked is not None:
+					v=deflate(v);v/=np.linalg.norm(v)
+				Es.append(E);vs.append(v);residuals.append(sinfo['residual'])
+				info['niter']+=sinfo['niter'];info['nmatvec']+=sinfo['nmatvec']
+			Es=np.array(Es)
+			info['residual']=None if None in residuals else max(residuals)
+		info['time']=time.time()-t0
+		info['tol']=tol
+		info['method']=self.method
+		return Es,vs,info
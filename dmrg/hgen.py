@@ -1,13 +1,28 @@
 import numpy as np
-from scipy.sparse import kron,identity
+from scipy.sparse import identity,diags
 from copy import copy,deepcopy
 
 from ops import Z,Zs
-from utils import index_map
+from utils import index_map,tofmt,fkron,block_sum,psign,transform_parity
 
 class HGen(object):
-	def __init__(self,terms,L,d=2,part='left',fermi=False,sfermi=False,sectors=np.array([0.5,-0.5])):
+	'''
+	hamiltonian generator of a left or right block
+
+	blocks are copy-on-write:enlarge and transform never modify a matrix,a pterm or an array
+	in place but bind new ones,so a shallow copy(hgen) is an independent snapshot that shares
+	the operator matrices with the original.
+	block operators are dense arrays up to dimension dense_dim and csr matrices above.
+
+	fermionic operators are graded by their parity instead of carrying jordan-wigner strings:every odd
+	operator at site j stands for P_{<j}.op,where P is the fermion parity.basis_parity holds the parity(+-1)
+	of every block state,an operator A of the left block is extended by B as (A.P^p(B))xB and one of the
+	right block as (B.P_site^p(A))xA,the string over the other block is added by the SuperBlock.
+	'''
+	def __init__(self,terms,L,d=2,part='left',fermi=False,sfermi=False,sectors=np.array([0.5,-0.5]),dense_dim=64):
 		self.l=1;self.d=d;self.D=self.d
+		self.dense_dim=dense_dim #block operators up to this dimension are kept dense,larger ones as csr
+		self.site_cache={} #identity padded site operators,keyed by (D,term index,op index)
 		self.H=np.zeros([self.d,self.d])
 		self.terms=terms;self.pterms=[]
 		self.L=L;self.part=part
@@ -16,16 +31,17 @@ class HGen(object):
 		self.basis_by_sector=index_map(self.basis_sector_array)
 		
 		if fermi==True:
-			self.I=Z
+			self.site_parity=np.diag(Z)
 		elif sfermi==True:
-			self.I=Zs
+			self.site_parity=np.diag(Zs)
 		else:
-			self.I=identity(self.d)
+			self.site_parity=None
+		self.basis_parity=copy(self.site_parity)
 
 		if self.part=='left':
 			for term in self.terms:
 				if len(term.ops)==1 and (term.ops[0].site is None or term.ops[0].site==1):
-					self.H+=term.ops[0].mat*term.param
+					self.H=self.H+term.ops[0].mat*term.param
 				elif len(term.ops)>1 and (term.ops[0].site is None or term.ops[0].site==1):
 					pterm=deepcopy(term)
 					pterm.ops[0].site=1
@@ -37,7 +53,7 @@ class HGen(object):
 		else:
 			for term in self.terms:
 				if len(term.ops)==1 and (term.ops[-1].site is None or term.ops[-1].site==self.L):
-					self.H+=term.ops[-1].mat*term.param
+					self.H=self.H+term.ops[-1].mat*term.param
 				elif len(term.ops)>1 and (term.ops[-1].site is None or term.ops[-1].site==self.L):
 					pterm=deepcopy(term)
 					pterm.ops[-1].site=self.L
@@ -47,73 +63,151 @@ class HGen(object):
 						pterm.ops[-i-2].site=pterm.ops[-i-1].site-pterm.dists[-i-1]
 					self.pterms.append(pterm)
 		
+	def __getstate__(self): #the padded operator cache is not stored with a block
+		state=self.__dict__.copy()
+		state['site_cache']={}
+		return state
+
+	def pad(self,i,k):
+		'''operator k of term i on the new site,padded with the identity of the current block'''
+		key=(self.D,i,k)
+		if key not in self.site_cache:
+			mat=self.terms[i].ops[k].mat
+			if self.part=='left':
+				self.site_cache[key]=fkron(identity(self.D),mat,self.dense_dim)
+			else:
+				self.site_cache[key]=fkron(mat,identity(self.D),self.dense_dim)
+		return self.site_cache[key]
+
 	def enlarge(self):
 		self.l+=1
+		D=self.D*self.d
 		if self.part=='left':
-			self.H=kron(self.H,identity(self.d))
+			hterms=[fkron(self.H,identity(self.d),self.dense_dim)]
 			pts=[]
 			for pterm in self.pterms:
+				pterm=copy(pterm);pterm.current_op=copy(pterm.current_op)
 				if pterm.ops[pterm.current_index+1].site==self.l:
-					pterm.current_index+=1					
-					pterm.current_op.mat=kron(pterm.current_op.mat,pterm.ops[pterm.current_index].mat) #other attribute?
+					pterm.current_index+=1
+					op=pterm.ops[pterm.current_index]
+					mat=pterm.current_op.mat
+					if op.parity:
+						mat=psign(mat,self.basis_parity)
+						pterm.current_op.parity=(pterm.current_op.parity+op.parity)%2
+					pterm.current_op.mat=fkron(mat,op.mat,self.dense_dim) #other attribute?
 				else:
-					pterm.current_op.mat=kron(pterm.current_op.mat,self.I)
+					pterm.current_op.mat=fkron(pterm.current_op.mat,identity(self.d),self.dense_dim)
 				if pterm.current_index<len(pterm.ops)-1:
 					pts.append(pterm)
 				else:
-					self.H+=pterm.current_op.mat*pterm.param
+					hterms.append(pterm.current_op.mat*pterm.param)
 			
-			self.pterms=deepcopy(pts)
-			for term in self.terms:
+			self.pterms=pts
+			for i,term in enumerate(self.terms):
 				if len(term.ops)==1 and (term.ops[0].site is None or term.ops[0].site==self.l):
-					self.H+=kron(identity(self.D),term.ops[0].mat)*term.param
+					hterms.append(self.pad(i,0)*term.param)
 				elif len(term.ops)>1 and (term.ops[0].site is None or term.ops[0].site==self.l):
 					pterm=deepcopy(term)
 					pterm.current_index=0
-					pterm.current_op=deepcopy(pterm.ops[0])
-					pterm.current_op.mat=kron(identity(self.D),pterm.current_op.mat)
+					pterm.current_op=copy(pterm.ops[0])
+					if pterm.current_op.parity:
+						pterm.current_op.mat=fkron(diags(self.basis_parity),pterm.ops[0].mat,self.dense_dim)
+					else:
+						pterm.current_op.mat=self.pad(i,0)
 					pterm.ops[0].site=self.l
-					for i in range(len(pterm.dists)):
-						pterm.ops[i+1].site=pterm.dists[i]+pterm.ops[i].site
+					for j in range(len(pterm.dists)):
+						pterm.ops[j+1].site=pterm.dists[j]+pterm.ops[j].site
 					self.pterms.append(pterm) 
 
 			self.basis_sector_array=np.add.outer(self.basis_sector_array,self.single_site_sectors).flatten()
+			if self.site_parity is not None:
+				self.basis_parity=np.outer(self.basis_parity,self.site_parity).flatten()
 
 		else:
-			self.H=kron(identity(self.d),self.H)
+			hterms=[fkron(identity(self.d),self.H,self.dense_dim)]
 			pts=[]
 			for pterm in self.pterms:
+				pterm=copy(pterm);pterm.current_op=copy(pterm.current_op)
 				if pterm.ops[pterm.current_index-1].site==self.L-self.l+1:
 					pterm.current_index-=1
-					pterm.current_op.mat=kron(pterm.ops[pterm.current_index].mat,pterm.current_op.mat)
+					op=pterm.ops[pterm.current_index]
+					mat,parity=op.mat,op.parity
 				else:
-					pterm.current_op.mat=kron(self.I,pterm.current_op.mat)
+					mat,parity=identity(self.d),0
+				if pterm.current_op.parity:
+					mat=psign(mat,self.site_parity)
+				pterm.current_op.parity=(pterm.current_op.parity+parity)%2
+				pterm.current_op.mat=fkron(mat,pterm.current_op.mat,self.dense_dim)
 				if pterm.current_index>0:
 					pts.append(pterm)
 				else:
-					self.H+=pterm.current_op.mat*pterm.param
+					hterms.append(pterm.current_op.mat*pterm.param)
 			
-			self.pterms=deepcopy(pts)
-			for term in self.terms:
+			self.pterms=pts
+			for i,term in enumerate(self.terms):
 				if len(term.ops)==1 and (term.ops[-1].site is None or term.ops[-1].site==self.L-self.l+1):
-					self.H+=kron(term.ops[-1].mat,identity(self.D))*term.param
+					hterms.append(self.pad(i,-1)*term.param)
 				elif len(term.ops)>1 and (term.ops[-1].site is None or term.ops[-1].site==self.L-self.l+1):
 					pterm=deepcopy(term)
 					pterm.current_index=len(pterm.ops)-1
-					pterm.current_op=deepcopy(pterm.ops[-1])
-					pterm.current_op.mat=kron(pterm.current_op.mat,identity(self.D))
+					pterm.current_op=copy(pterm.ops[-1])
+					pterm.current_op.mat=self.pad(i,-1)
 					pterm.ops[-1].site=self.L-self.l+1
-					for i in range(len(pterm.dists)):
-						pterm.ops[-i-2].site=pterm.ops[-i-1].site-pterm.dists[-i-1]
+					for j in range(len(pterm.dists)):
+						pterm.ops[-j-2].site=pterm.ops[-j-1].site-pterm.dists[-j-1]
 					self.pterms.append(pterm)
 
 			self.basis_sector_array=np.add.outer(self.single_site_sectors,self.basis_sector_array).flatten()
+			if self.site_parity is not None:
+				self.basis_parity=np.outer(self.site_parity,self.basis_parity).flatten()
 
+		self.H=block_sum(hterms,D,self.dense_dim)
 		self.basis_by_sector=index_map(self.basis_sector_array)
-		self.D*=self.d
+		self.D=D
+
+	def reflection(self):
+		'''
+		{label:label of the reflected term} for all terms,None if the model is not reflection symmetric,
+		i.e. some term has no partner with the operators in reverse order,or is fermionic.terms on explicit
+		sites also give None,the mirror stands for blocks of changing chain lengths where site i has no fixed image
+		'''
+		if self.site_parity is not None or any(op.site is not None for term in self.terms for op in term.ops):
+			return None
+		labels={}
+		for term in self.terms: #a single-site term is its own partner if no other term matches
+			for other in self.terms:
+				if len(other.ops)==len(term.ops) and other.param==term.param and list(other.dists)==list(term.dists)[::-1]\
+					and all(np.allclose(tofmt(a.mat,np.inf),tofmt(b.mat,np.inf)) for a,b in zip(term.ops,other.ops[::-1])):
+					labels[term.label]=other.label
+					break
+			else:
+				return None
+		return labels
+
+	def mirror(self,labels):
+		'''
+		the reflected block,used as the right block of a reflection symmetric model
+		labels:the label map of reflection().the basis of the mirror keeps the (block,site) order of this block
+		'''
+		hgen=copy(self)
+		hgen.part='right'
+		pts=[]
+		for pterm in self.pterms:
+			pterm=copy(pterm);pterm.label=labels[pterm.label]
+			pts.append(pterm)
+		hgen.pterms=pts
+		return hgen
 
 	def transform(self,T):
-		self.H=T.conjugate().transpose().dot(self.H.dot(T))
+		Tdag=T.conjugate().transpose()
+		self.H=tofmt(Tdag.dot(T.transpose().dot(self.H.transpose()).transpose()),self.dense_dim)
+		pts=[]
 		for pterm in self.pterms:
-			pterm.current_op.mat=T.conjugate().transpose().dot(pterm.current_op.mat.dot(T))
+			pterm=copy(pterm);pterm.current_op=copy(pterm.current_op)
+			mat=pterm.current_op.mat
+			pterm.current_op.mat=tofmt(Tdag.dot(T.transpose().dot(mat.transpose()).transpose()),self.dense_dim)
+			pts.append(pterm)
+		self.pterms=pts
+		if self.site_parity is not None:
+			self.basis_parity=transform_parity(self.basis_parity,T)
 		self.D=self.H.shape[0]
@@ -0,0 +1,95 @@
+'''
+expectation values and correlation functions of an mps with cached environments
+
+environments are matrices with the bra index first,Ls[i] contains sites 0..i-1 and Rs[i] sites i..L-1.
+'''
+import numpy as np
+
+def lstep(L,M,O=None):
+	'''add site tensor M with operator O(the identity if None) to the left environment L[a,a']'''
+	T=np.tensordot(L,M,axes=(1,0)) #a,s',b'
+	if O is None:
+		T=T.transpose(1,0,2)
+	else:
+		T=np.tensordot(O,T,axes=(1,1)) #s,a,b'
+	return np.tensordot(M.conjugate(),T,axes=([0,1],[1,0])) #b,b'
+
+def rstep(R,M,O=None):
+	'''add site tensor M with operator O(the identity if None) to the right environment R[b,b']'''
+	T=np.tensordot(M,R,axes=(2,1)) #a',s',b
+	if O is None:
+		T=T.transpose(1,0,2)
+	else:
+		T=np.tensordot(O,T,axes=(1,1)) #s,a',b
+	return np.tensordot(M.conjugate(),T,axes=([1,2],[0,2])) #a,a'
+
+def site_tensors(mps):
+	'''site tensors of an mps with the schmidt values absorbed'''
+	if hasattr(mps,'Psi') or mps.S is None: #contract_s was called
+		return list(mps.Ms)
+	Bs=list(mps.Bs)
+	Bs[0]=np.tensordot(np.diag(mps.S),Bs[0],1)
+	return list(mps.As)+Bs
+
+class Measurer(object):
+	'''
+	measurements on an mps,the left and right environments are contracted once and shared by all calls
+	construct:Measurer(mps)
+	'''
+	def __init__(self,mps):
+		self.Ms=site_tensors(mps)
+		self.L=len(self.Ms)
+		self.Ls=[np.ones((1,1))]
+		for M in self.Ms:
+			self.Ls.append(lstep(self.Ls[-1],M))
+		self.Rs=[np.ones((1,1))]
+		for M in reversed(self.Ms):
+			self.Rs.insert(0,rstep(self.Rs[0],M))
+		self.norm=self.Ls[-1][0,0]
+
+	def local(self,X,i,R):
+		'''[s,s'] matrix of site i between the left environment X and the right environment R'''
+		M=self.Ms[i]
+		T=np.tensordot(np.tensordot(X,M,axes=(1,0)),R,axes=(2,1)) #a,s',b
+		return np.tensordot(M.conjugate(),T,axes=([0,2],[0,2]))
+
+	def expect(self,ops):
+		'''
+		<O_i> of all sites i
+		ops:a matrix or a list of matrices,returns an array (L,) or (len(ops),L)
+		'''
+		single=not isinstance(ops,(list,tuple))
+		ops=[ops] if single else ops
+		res=np.zeros((len(ops),self.L),dtype=np.result_type(self.norm,*ops))
+		for i in range(self.L):
+			rho=self.local(self.Ls[i],i,self.Rs[i+1])
+			for k,O in enumerate(ops):
+				res[k,i]=np.sum(rho*O)
+		res/=self.norm
+		return res[0] if single else res
+
+	def correlation(self,ops,string=None):
+		'''
+		<A_i B_j> of all pairs of sites,every operator of the product is taken from ops
+		ops:a matrix or a list of matrices,returns C[i,j] or C[a,b,i,j]=<ops[a]_i ops[b]_j>,the operators
+		are applied in site order and on the same site as the matrix product ops[a].ops[b]
+		string:operator on the sites between i and j,e.g. the jordan-wigner string
+		'''
+		single=not isinstance(ops,(list,tuple))
+		ops=[ops] if single else ops
+		n=len(ops)
+		C=np.zeros((n,n,self.L,self.L),dtype=np.result_type(self.norm,*ops))
+		for i in range(self.L):
+			rho=self.local(self.Ls[i],i,self.Rs[i+1])
+			for a in range(n):
+				for b in range(n):
+					C[a,b,i,i]=np.sum(rho*ops[a].dot(ops[b]))
+			for a,A in enumerate(ops):
+				X=lstep(self.Ls[i],self.Ms[i],A)
+				for j in range(i+1,self.L):
+					rho=self.local(X,j,self.Rs[j+1])
+					for b,B in enumerate(ops):
+						C[a,b,i,j]=C[b,a,j,i]=np.sum(rho*B)
+					X=lstep(X,self.Ms[j],string)
+		C/=self.norm
+		return C[0,0] if single else C
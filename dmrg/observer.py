@@ -0,0 +1,155 @@
+'''
+observers of the dmrg engine
+
+the engine calls start(engine) before every step,step(engine,record) after it with a dict record of the step,
+and sweep(engine,record) after every finished sweep.observers are called in order,so an observer that adds
+fields to the record(ProfileObserver) has to come before the sinks that should see them.
+
+fields of a step record:
+step:index of the step,sweep:index of the sweep(0 for the infinite warmup),direction:'infinite','right' or 'left'
+site:length of the enlarged left block,length:length of the superblock,m:maximum number of kept states
+DL,DR:dimensions of the enlarged blocks,kept:dimensions of the truncated blocks
+energy:lowest energy of the first target,energies:[(sector,energies of the targeted states)]
+trunc_err:discarded weight,niter,nmatvec:eigensolver iterations and matvecs of all targets,tol:eigensolver tolerance
+overlap:overlaps of the start vectors with the solutions of the first target
+time:{'enlarge','build','eigensolve','truncate','transform'} wall times in seconds
+bond_energy:energy per site of the added bonds(idmrg only)
+'''
+import sys,json,cProfile,pstats
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc=None
+	import resource
+
+class Observer(object):
+	'''base observer,does nothing'''
+	def start(self,engine):
+		pass
+
+	def step(self,engine,record):
+		pass
+
+	def sweep(self,engine,record):
+		pass
+
+	def close(self,engine):
+		pass
+
+class PrintObserver(Observer):
+	'''prints the progress of every step,the default observer'''
+	banners={'infinite':('*','*'),'right':('-','='),'left':('=','-')}
+
+	def step(self,engine,record):
+		lchar,rchar=self.banners[record['direction']]
+		print lchar*(record['site']-1)+'++'+rchar*(record['length']-record['site']-1)
+		print 'E=',record['energy']/record['length']
+		if 'bond_energy' in record:
+			print 'E/bond=',record['bond_energy']
+		overlap=record['overlap']
+		if overlap:
+			print 'overlap =',overlap[0] if len(overlap)==1 else overlap
+		print 'iter=',record['niter'],'matvec=',record['nmatvec'],'time=%.3gs'%record['time']['eigensolve'],'tol=',record['tol']
+		if len(record['energies'])>1 or len(record['energies'][0][1])>1:
+			E0=min(energies[0] for sector,energies in record['energies'])
+			for sector,energies in record['energies']:
+				print 'sector=',sector,'E=',energies,'gap=',[E-E0 for E in energies]
+
+	def sweep(self,engine,record):
+		if record['converged']:
+			print 'converged after sweep',record['sweep']
+
+class JSONObserver(Observer):
+	'''
+	writes every step record as one line of json
+	construct:JSONObserver(f),f:a file name or an open file
+	'''
+	def __init__(self,f):
+		self.own=not hasattr(f,'write')
+		self.f=open(f,'w') if self.own else f
+
+	def step(self,engine,record):
+		self.f.write(json.dumps(record)+'\n')
+		self.f.flush()
+
+	def sweep(self,engine,record):
+		self.f.write(json.dumps(dict(record,event='sweep'))+'\n')
+		self.f.flush()
+
+	def close(self,engine):
+		if self.own:
+			self.f.close()
+
+class CheckpointObserver(Observer):
+	'''
+	writes a checkpoint of the engine(DMRGEngine.save) every few steps and after every sweep
+	construct:CheckpointObserver(path,every=10)
+	'''
+	def __init__(self,path,every=10):
+		self.path=path
+		self.every=every
+
+	def step(self,engine,record):
+		if self.every and engine.nstep%self.every==0:
+			engine.save(self.path)
+
+	def sweep(self,engine,record):
+		engine.save(self.path)
+
+class ProfileObserver(Observer):
+	'''
+	profiles the steps start<=step<stop with cProfile and adds the peak memory of every profiled step
+	to its record(field peak_memory in bytes:traced by tracemalloc,the maximum resident size where
+	tracemalloc is missing).the statistics are written to path(pstats format) or printed after the last
+	profiled step.
+	construct:ProfileObserver(start=0,stop=None,path=None,sort='cumulative',nlines=20)
+	'''
+	def __init__(self,start=0,stop=None,path=None,sort='cumulative',nlines=20):
+		self.range=(start,stop)
+		self.path=path
+		self.sort=sort
+		self.nlines=nlines
+		self.profile=cProfile.Profile()
+		self.active=False
+		self.nprofiled=0
+		self.done=False
+
+	def inrange(self,step):
+		start,stop=self.range
+		return step>=start and (stop is None or step<stop)
+
+	def start(self,engine):
+		if self.inrange(engine.nstep):
+			self.active=True
+			if tracemalloc is not None:
+				tracemalloc.start()
+			self.profile.enable()
+
+	def step(self,engine,record):
+		if not self.active:
+			return
+		self.profile.disable()
+		self.active=False
+		self.nprofiled+=1
+		if tracemalloc is not None:
+			record['peak_memory']=tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+		else:
+			record['peak_memory']=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+		if self.range[1] is not None and record['step']==self.range[1]-1:
+			self.report()
+
+	def report(self):
+		if self.done or self.nprofiled==0:
+			return
+		self.done=True
+		if self.path is not None:
+			self.profile.dump_stats(self.path)
+		else:
+			pstats.Stats(self.profile,stream=sys.stdout).sort_stats(self.sort).print_stats(self.nlines)
+
+	def close(self,engine):
+		if self.active:
+			self.profile.disable()
+			self.active=False
+		self.report()
@@ -3,6 +3,7 @@ import numpy as np
 from copy import deepcopy
 from scipy.sparse import kron,identity
 
+#fermion parity of the site states
 Z=np.array([[-1,0],[0,1]])
 Zs=np.array([[1,0,0,0],[0,-1,0,0],[0,0,-1,0],[0,0,0,1]])
 
@@ -16,11 +17,13 @@ class Op(object):
 	label:label of the operator,str
 	site:site of the operator
 	spin:spin of the operator,'up'/'dn' or None
+	parity:1 for fermionic(odd) operators,0 otherwise
 	'''
-	def __init__(self,mat,label=None,site=None): #should site and spin be attributes of Op or Onsite/Twosite?
+	def __init__(self,mat,label=None,site=None,parity=0): #should site and spin be attributes of Op or Onsite/Twosite?
 		self.mat=mat
 		self.label=label
 		self.site=site
+		self.parity=parity
 
 class Term(object): #spin and bose term
 	def __init__(self,ops=[],param=1.,dists=[1],label=None):
@@ -29,25 +32,14 @@ class Term(object): #spin and bose term
 		self.dists=dists
 		self.label=label
 
-class FTerm(object):
-	def __init__(self,ops=[],param=1.,dists=[1],label=None):
-		self.ops=deepcopy(ops)
-		self.param=param
-		self.dists=dists
-		self.label=label
-		for i in range(len(self.ops)):
-			if (len(self.ops)-i)%2==0:
-				self.ops[i].mat=self.ops[i].mat.dot(Z)	
+class FTerm(Term):
+	'''
+	fermionic term,the operators are the bare site operators and their parities give the jordan-wigner signs,
+	which HGen and SuperBlock apply as the blocks are combined(no string operators are stored)
+	'''
+	pass
 
-class SFTerm(object):
-	def __init__(self,ops=[],param=1.,dists=[1],label=None):
-		self.ops=deepcopy(ops)
-		self.param=param
-		self.dists=dists
-		self.label=label
-		for i in range(len(self.ops)):
-			if (len(self.ops)-i)%2==0:
-				self.ops[i].mat=self.ops[i].mat.dot(Zs)	
+SFTerm=FTerm #spinful fermions,the parities of the site states are set by HGen(sfermi=True)
 
 oplib={}
 
@@ -55,15 +47,15 @@ oplib['s+']=Op(label='S+',mat=np.array([[0,1],[0,0]]))
 oplib['s-']=Op(label='S-',mat=np.array([[0,0],[1,0]]))
 oplib['sz']=Op(label='Sz',mat=np.array([[1,0],[0,-1]])*0.5)
 
-oplib['c+']=Op(label='c+',mat=np.array([[0,1],[0,0]]))
-oplib['c']=Op(label='c',mat=np.array([[0,0],[1,0]]))
+oplib['c+']=Op(label='c+',mat=np.array([[0,1],[0,0]]),parity=1)
+oplib['c']=Op(label='c',mat=np.array([[0,0],[1,0]]),parity=1)
 oplib['n']=Op(label='n',mat=np.array([[1,0],[0,0]]))
 
 #spin fermi
-oplib['Cup+']=Op(label='Cup+',mat=np.array([[0,0,1,0],[0,0,0,1],[0,0,0,0],[0,0,0,0]]))
-oplib['Cup']=Op(label='Cup',mat=np.array([[0,0,0,0],[0,0,0,0],[1,0,0,0],[0,1,0,0]]))
-oplib['Cdn+']=Op(label='Cdn+',mat=np.array([[0,-1,0,0],[0,0,0,0],[0,0,0,1],[0,0,0,0]]))
-oplib['Cdn']=Op(label='Cdn',mat=np.array([[0,0,0,0],[-1,0,0,0],[0,0,0,0],[0,0,1,0]]))
+oplib['Cup+']=Op(label='Cup+',mat=np.array([[0,0,1,0],[0,0,0,1],[0,0,0,0],[0,0,0,0]]),parity=1)
+oplib['Cup']=Op(label='Cup',mat=np.array([[0,0,0,0],[0,0,0,0],[1,0,0,0],[0,1,0,0]]),parity=1)
+oplib['Cdn+']=Op(label='Cdn+',mat=np.array([[0,-1,0,0],[0,0,0,0],[0,0,0,1],[0,0,0,0]]),parity=1)
+oplib['Cdn']=Op(label='Cdn',mat=np.array([[0,0,0,0],[-1,0,0,0],[0,0,0,0],[0,0,1,0]]),parity=1)
 
 #spin bose
 
@@ -0,0 +1,56 @@
+'''
+sweep schedules of the finite dmrg
+'''
+from collections import namedtuple
+
+Sweep=namedtuple('Sweep',['m','tol','noise','max_trunc'])
+
+def pick(value,i):
+	'''i-th entry of a per sweep parameter,the last entry repeats and a single value holds for all sweeps'''
+	if isinstance(value,(list,tuple)):
+		return value[min(i,len(value)-1)]
+	return value
+
+class SweepSchedule(object):
+	'''
+	bond dimension,eigensolver tolerance,density matrix noise and maximum truncation error of every sweep
+	construct:SweepSchedule(mlist,tols=None,noises=0.,max_truncs=0.,energy_tol=None,trunc_tol=None,min_sweeps=2)
+
+	mlist fixes the number of sweeps,the other parameters are lists(one entry per sweep) or single values.
+	tols=None keeps the tolerance of the eigensolver,max_truncs>0 keeps fewer than m states when the
+	discarded weight allows it.
+	the sweeps stop early once the energy changes by less than energy_tol and the largest discarded weight
+	of a sweep by less than trunc_tol between two sweeps,energy_tol=None never stops early.no early stop
+	before a sweep with the final m of mlist has run.
+	'''
+	def __init__(self,mlist,tols=None,noises=0.,max_truncs=0.,energy_tol=None,trunc_tol=None,min_sweeps=2):
+		self.mlist=list(mlist)
+		self.tols=tols
+		self.noises=noises
+		self.max_truncs=max_truncs
+		self.energy_tol=energy_tol
+		self.trunc_tol=trunc_tol
+		self.min_sweeps=min_sweeps
+
+	def __len__(self):
+		return len(self.mlist)
+
+	def __getitem__(self,i):
+		return Sweep(self.mlist[i],pick(self.tols,i),pick(self.noises,i),pick(self.max_truncs,i))
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def converged(self,energies,errs):
+		'''
+		energies:energies(arrays of all targeted states) at the end of every finished sweep
+		errs:largest discarded weight of every finished sweep
+		'''
+		if self.energy_tol is None or len(energies)<max(2,self.min_sweeps):
+			return False
+		if self.mlist[min(len(energies),len(self))-1]!=self.mlist[-1]: #the final m has not run yet
+			return False
+		if abs(energies[-1]-energies[-2]).max()>=self.energy_tol:
+			return False
+		return self.trunc_tol is None or abs(errs[-1]-errs[-2])<self.trunc_tol
@@ -1,124 +1,367 @@
 import numpy as np
-from scipy.sparse import kron,identity,lil_matrix
-from scipy.sparse.linalg import eigsh
-from copy import copy,deepcopy
+from scipy.sparse import kron,identity,csr_matrix,coo_matrix,issparse
+from scipy.sparse.linalg import LinearOperator
+from copy import copy
+from collections import OrderedDict
 
-from utils import index_map
+from utils import index_map,psign
+from eigsolve import EigenSolver
 
 class SuperBlock(object):
-	def __init__(self,lhgen,rhgen,target_sector=0.,joint=True):
-		self.lhgen=deepcopy(lhgen)
-		self.rhgen=deepcopy(rhgen)
+	'''
+	superblock of an enlarged left block and an enlarged right block
+	construct:SuperBlock(lhgen,rhgen,target_sector=0.,joint=True,matfree=True,index_cache=None)
+
+	with matfree=True the hamiltonian is never built,eigen() works on a LinearOperator which acts on
+	the wavefunction reshaped as a (lhgen.D,rhgen.D) matrix:H_L.psi+psi.H_R^T+sum_k A_k.psi.B_k^T
+	index_cache:an IndexCache of the restricted indices,default the module wide one
+	'''
+	def __init__(self,lhgen,rhgen,target_sector=0.,joint=True,matfree=True,index_cache=None):
+		self.lhgen=copy(lhgen) #blocks are copy-on-write,a shallow copy is a snapshot
+		self.rhgen=copy(rhgen)
 		self.L=self.lhgen.l+self.rhgen.l
-		self.H=kron(self.lhgen.H,identity(self.rhgen.D))+kron(identity(self.lhgen.D),self.rhgen.H)
+		self.matfree=matfree
+		self.joint_ops=[]
 		if joint==True:
 			for lpterm in self.lhgen.pterms:
 				for rpterm in self.rhgen.pterms:
 					if lpterm.label==rpterm.label: #label must include all the important imformation
-						self.H=self.H+kron(lpterm.current_op.mat,rpterm.current_op.mat)*lpterm.param
+						lop=lpterm.current_op.mat
+						if rpterm.current_op.parity: #jordan-wigner string of the odd right part over the left block
+							lop=psign(lop,self.lhgen.basis_parity)
+						self.joint_ops.append((lop,rpterm.current_op.mat,lpterm.param))
 
 		self.target_sector=target_sector
-		self.sector_indices={}
-		self.rsector_indices={}
-		self.restricted_basis_indices=[]
-		for sys_sec,sys_basis_states in self.lhgen.basis_by_sector.items():
-			self.sector_indices[sys_sec]=[]
-			env_sec=target_sector-sys_sec
-			if env_sec in self.rhgen.basis_by_sector:
-				self.rsector_indices[env_sec]=[]
-				for i in sys_basis_states:
-					i_offset=self.rhgen.D*i
-					for j in self.rhgen.basis_by_sector[env_sec]:
-						current_index=len(self.restricted_basis_indices)
-						self.sector_indices[sys_sec].append(current_index)
-						self.rsector_indices[env_sec].append(current_index)
-						self.restricted_basis_indices.append(i_offset+j)
-		self.restricted_superblock_hamiltonian=self.H.todense()[:,self.restricted_basis_indices][self.restricted_basis_indices,:]
-		#self.restricted_superblock_hamiltonian.to? 
-					
-	def eigen(self,psi0_guess=None):
-		if psi0_guess is not None:
-			restricted_psi0_guess=psi0_guess[self.restricted_basis_indices]			
+		self.sector_indices,self.rsector_indices,self.restricted_basis_indices=\
+			restricted_indices(self.lhgen,self.rhgen,target_sector,index_cache)
+
+		if self.matfree:
+			n=len(self.restricted_basis_indices)
+			self.restricted_superblock_hamiltonian=LinearOperator((n,n),matvec=self.matvec,dtype='d')
+		else:
+			self.H=kron(self.lhgen.H,identity(self.rhgen.D))+kron(identity(self.lhgen.D),self.rhgen.H)
+			for lop,rop,param in self.joint_ops:
+				self.H=self.H+kron(lop,rop)*param
+			self.restricted_superblock_hamiltonian=self.H.todense()[:,self.restricted_basis_indices][self.restricted_basis_indices,:]
+
+	def matvec(self,v):
+		'''apply the restricted superblock hamiltonian to a restricted vector v'''
+		psi=np.zeros((self.lhgen.D,self.rhgen.D),dtype=np.result_type(v,'d'))
+		psi.flat[self.restricted_basis_indices]=np.ravel(v)
+		hpsi=self.lhgen.H.dot(psi)+self.rhgen.H.dot(psi.T).T
+		for lop,rop,param in self.joint_ops:
+			hpsi=hpsi+param*lop.dot(rop.dot(psi.T).T)
+		return np.asarray(hpsi).flat[self.restricted_basis_indices]
+
+	def diagonal(self):
+		'''diagonal of the restricted superblock hamiltonian,used as davidson preconditioner'''
+		diag=np.add.outer(np.ravel(self.lhgen.H.diagonal()),np.ravel(self.rhgen.H.diagonal()))
+		for lop,rop,param in self.joint_ops:
+			diag=diag+param*np.outer(np.ravel(lop.diagonal()),np.ravel(rop.diagonal()))
+		return diag.flat[self.restricted_basis_indices]
+
+	def restrict(self,psi):
+		'''restricted vector of a guess,which is None(random),a sparse (lhgen.D,rhgen.D) matrix or a full vector'''
+		if psi is None:
+			return np.random.rand(len(self.restricted_basis_indices))-0.5
+		elif issparse(psi):
+			return self.gather(psi)
 		else:
-			restricted_psi0_guess=None
-			
-		energys,restricted_psi0s=eigsh(self.restricted_superblock_hamiltonian,k=1,which="SA",v0=restricted_psi0_guess)
-		self.restricted_psi0=restricted_psi0s[:,0]
+			return np.ravel(psi)[self.restricted_basis_indices]
+
+	def eigen(self,psi0_guess=None,solver=None,sweep=None,trunc_err=0.,k=1,tol=None):
+		'''
+		lowest state in the target sector,or the k lowest states
+		psi0_guess:guess of the lowest state,or a list of guesses of the k states(missing ones are random)
+		solver:an EigenSolver,sweep and trunc_err are passed to it to choose tolerance and iteration cap
+		tol:tolerance replacing the default one of the solver,None keeps it
 
-		self.full_psi0=np.zeros([self.lhgen.D*self.rhgen.D,1],dtype='d')
-		for i,z in enumerate(self.restricted_basis_indices):
-			self.full_psi0[z,0]=self.restricted_psi0[i]
+		the states are kept in restricted_psis and their energies in energies,restricted_psi0 is the lowest one.
+		'''
+		if solver is None:
+			solver=EigenSolver()
+		guesses=psi0_guess if isinstance(psi0_guess,list) else [psi0_guess]
+		guesses=(guesses+[None]*k)[:k]
+		restricted_guesses=[self.restrict(psi) for psi in guesses]
 
-		if psi0_guess is not None:
-			overlap=np.absolute(np.dot(psi0_guess.conjugate().transpose(),self.full_psi0).item())
-			overlap/=np.linalg.norm(psi0_guess)*np.linalg.norm(self.full_psi0)
-			print "overlap =",overlap
+		if self.matfree:
+			matvec=self.matvec
+		else:
+			matvec=lambda v:np.ravel(self.restricted_superblock_hamiltonian.dot(v))
+		self.energies,self.restricted_psis,self.info=solver.eigs(matvec,restricted_guesses,self.diagonal(),sweep,trunc_err,tol)
+		self.restricted_psi0=self.restricted_psis[0]
 
-		return energys[0],self.restricted_psi0
+		self.info['overlap']=[]
+		for psi,guess,v in zip(guesses,restricted_guesses,self.restricted_psis):
+			if psi is not None:
+				overlap=np.absolute(np.dot(guess.conjugate(),v))
+				self.info['overlap'].append(overlap/(np.linalg.norm(guess)*np.linalg.norm(v)))
+
+		return self.energies[0],self.restricted_psi0
 	
-	def transmat(self,m,use_qn=True):
-		rho_block_dict={}
-		for sys_sec,indices in self.sector_indices.items():
-			if indices:
+	def psi_matrix(self,i=0):
+		'''the i-th state as a sparse (lhgen.D,rhgen.D) matrix'''
+		indices=np.asarray(self.restricted_basis_indices)
+		return coo_matrix((self.restricted_psis[i],(indices//self.rhgen.D,indices%self.rhgen.D)),shape=(self.lhgen.D,self.rhgen.D))
+
+	def gather(self,psi):
+		'''restricted vector from a sparse (lhgen.D,rhgen.D) matrix'''
+		indices=np.asarray(self.restricted_basis_indices)
+		return np.asarray(psi.tocsr()[indices//self.rhgen.D,indices%self.rhgen.D]).ravel()
+
+	@property
+	def full_psi0(self):
+		'''the wavefunction in the full superblock space,only materialized on request'''
+		full_psi0=np.zeros([self.lhgen.D*self.rhgen.D,1],dtype=self.restricted_psi0.dtype)
+		full_psi0[self.restricted_basis_indices,0]=self.restricted_psi0
+		return full_psi0
+
+	def truncate(self,m,tol=0.):
+		'''
+		truncate both blocks to m states with one blockwise svd of the wavefunction,
+		fewer if the discarded weight stays below tol.returns the left transformation matrix U,the schmidt values S and the right transformation matrix V
+		'''
+		sys_secs,env_secs,us,svals,vs=[],[],[],[],[]
+		for sys_sec in sorted(self.sector_indices.keys()):
+			indices=self.sector_indices[sys_sec]
+			if len(indices):
 				psi0_sector=self.restricted_psi0[indices]
 				psi0_sector=psi0_sector.reshape([len(self.lhgen.basis_by_sector[sys_sec]),-1],order="C")
-				rho_block_dict[sys_sec]=np.dot(psi0_sector,psi0_sector.conjugate().transpose())
-				
-		possible_eigenstates=[]
-		for sector,rho_block in rho_block_dict.items():
-			evals,evecs=np.linalg.eigh(rho_block)
-			current_sector_basis=self.lhgen.basis_by_sector[sector]
-			for eval,evec in zip(evals,evecs.transpose()):
-				possible_eigenstates.append((eval,evec,sector,current_sector_basis))
-		possible_eigenstates.sort(reverse=True,key=lambda x:x[0])
-	
-		my_m=min(len(possible_eigenstates),m)
-		transformation_matrix=lil_matrix((self.lhgen.D,my_m),dtype='d')
-		self.new_sector_array=np.zeros((my_m,),dtype='d')
-
-		possible_eigenstates=possible_eigenstates[:my_m]
-		possible_eigenstates.sort(reverse=False,key=lambda x:x[3])
-		for i,(eval,evec,sector,current_sector_basis) in enumerate(possible_eigenstates):
-			for j,v in zip(current_sector_basis,evec):
-				transformation_matrix[j,i]=v
-			self.new_sector_array[i]=sector
+				u,s,vdag=np.linalg.svd(psi0_sector,full_matrices=False)
+				sys_secs.append(sys_sec);env_secs.append(self.target_sector-sys_sec)
+				us.append(u);svals.append(s);vs.append(vdag.transpose())
+		nkept,self.discarded_weight=select_states([s**2 for s in svals],m,tol)
+
+		U=assemble([self.lhgen.basis_by_sector[sec] for sec in sys_secs],us,nkept,self.lhgen.D)
+		V=assemble([self.rhgen.basis_by_sector[sec] for sec in env_secs],vs,nkept,self.rhgen.D)
+		self.s=np.concatenate([s[:n] for s,n in zip(svals,nkept)])
+		self.spectrum=dict((sec,s[:n]**2) for sec,s,n in zip(sys_secs,svals,nkept) if n>0)
+		self.rspectrum=dict((sec,s[:n]**2) for sec,s,n in zip(env_secs,svals,nkept) if n>0)
+		self.rdiscarded_weight=self.discarded_weight
+		self.new_sector_array=np.repeat(sys_secs,nkept).astype('d')
+		self.rnew_sector_array=np.repeat(env_secs,nkept).astype('d')
 		self.new_basis_by_sector=index_map(self.new_sector_array)
+		self.rnew_basis_by_sector=index_map(self.rnew_sector_array)
+		return U,self.s,V
 
-		transformation_matrix=transformation_matrix.tocsr()
+	def rho_blocks(self,weight=1.):
+		'''
+		blockwise reduced density matrices of the left and the right block,summed over the states
+		in restricted_psis with the given weight each.returns {sys_sec:rho_L},{env_sec:rho_R}
+		'''
+		lrho,rrho={},{}
+		for sys_sec,indices in self.sector_indices.items():
+			env_sec=self.target_sector-sys_sec
+			for psi in self.restricted_psis:
+				psi0_sector=psi[indices].reshape([len(self.lhgen.basis_by_sector[sys_sec]),-1],order="C")
+				lrho[sys_sec]=lrho.get(sys_sec,0.)+weight*np.dot(psi0_sector,psi0_sector.conjugate().transpose())
+				rrho[env_sec]=rrho.get(env_sec,0.)+weight*np.dot(psi0_sector.transpose(),psi0_sector.conjugate())
+		return lrho,rrho
 
-		self.s=[]
-		for i in range(my_m):
-			self.s.append((possible_eigenstates[i][0])**0.5)
+	def noise_blocks(self,weight):
+		'''
+		blockwise density matrix perturbations weight*sum_k (A_k.psi)(A_k.psi)^dag of the left block and
+		weight*sum_k (psi.B_k^T)^T(psi.B_k^T)^* of the right block,summed over the states in restricted_psis,
+		A_k and B_k are the block operators of the joint terms.works on the sector blocks of psi,the
+		sector blocks of A_k and B_k that vanish are skipped,sparse(csr) blocks stay sparse
+		'''
+		lrho,rrho={},{}
+		for sys_sec,indices in self.sector_indices.items():
+			env_sec=self.target_sector-sys_sec
+			lbasis=self.lhgen.basis_by_sector[sys_sec]
+			rbasis=self.rhgen.basis_by_sector[env_sec]
+			lops,rops=[],[] #(sector,nonzero operator block acting on the sector of psi)
+			for lop,rop,param in self.joint_ops:
+				for sector,basis in self.lhgen.basis_by_sector.items():
+					op=lop[np.ix_(basis,lbasis)]
+					if (op.nnz if issparse(op) else np.any(op)):
+						lops.append((sector,op))
+				for sector,basis in self.rhgen.basis_by_sector.items():
+					op=rop[np.ix_(basis,rbasis)]
+					if (op.nnz if issparse(op) else np.any(op)):
+						rops.append((sector,op))
+			for psi in self.restricted_psis:
+				block=psi[indices].reshape([len(lbasis),-1],order="C")
+				for sector,op in lops:
+					phi=op.dot(block)
+					lrho[sector]=lrho.get(sector,0.)+weight*np.dot(phi,phi.conjugate().transpose())
+				for sector,op in rops:
+					phi=op.dot(block.transpose())
+					rrho[sector]=rrho.get(sector,0.)+weight*np.dot(phi,phi.conjugate().transpose())
+		return lrho,rrho
 
+	def transmat(self,m,use_qn=True):
+		rho_block_dict=self.rho_blocks(1./len(self.restricted_psis))[0]
+		transformation_matrix,self.new_sector_array,evals,self.spectrum,self.discarded_weight=\
+			rho_truncate(rho_block_dict,self.lhgen.basis_by_sector,self.lhgen.D,m)
+		self.new_basis_by_sector=index_map(self.new_sector_array)
+		self.s=np.sqrt(evals)
 		return transformation_matrix
 		
 	def rtransmat(self,m,use_qn=True): #should be discarded
-		rho_block_dict={}
-		for env_sec,indices in self.rsector_indices.items():
-			if indices: #
-				psi0_sector=self.restricted_psi0[indices]
-				psi0_sector=psi0_sector.reshape([-1,len(self.rhgen.basis_by_sector[env_sec])],order="C")
-				rho_block_dict[env_sec]=np.dot(psi0_sector.transpose(),psi0_sector.conjugate())
-
-		possible_eigenstates=[]
-		for sector,rho_block in rho_block_dict.items():
-			evals,evecs=np.linalg.eigh(rho_block)
-			current_sector_basis=self.rhgen.basis_by_sector[sector]
-			for eval,evec in zip(evals,evecs.transpose()):
-				possible_eigenstates.append((eval,evec,sector,current_sector_basis))
-		possible_eigenstates.sort(reverse=True,key=lambda x:x[0])
-
-		my_m=min(len(possible_eigenstates),m)
-		transformation_matrix=lil_matrix((self.rhgen.D,my_m),dtype='d') #
-		self.rnew_sector_array=np.zeros((my_m,),dtype='d')
-		
-		possible_eigenstates=possible_eigenstates[:my_m]
-		possible_eigenstates.sort(reverse=False,key=lambda x:x[3])
-		for i,(eval,evec,sector,current_sector_basis) in enumerate(possible_eigenstates):
-			for j,v in zip(current_sector_basis,evec):
-				transformation_matrix[j,i]=v #
-			self.rnew_sector_array[i]=sector
+		rho_block_dict=self.rho_blocks(1./len(self.restricted_psis))[1]
+		transformation_matrix,self.rnew_sector_array,evals,self.rspectrum,self.rdiscarded_weight=\
+			rho_truncate(rho_block_dict,self.rhgen.basis_by_sector,self.rhgen.D,m)
 		self.rnew_basis_by_sector=index_map(self.rnew_sector_array)
-		
-		transformation_matrix=transformation_matrix.tocsr()
 		return transformation_matrix
+
+def mixed_truncate(sblocks,m,noise=0.,tol=0.):
+	'''
+	truncate both blocks to m states(fewer if the discarded weight stays below tol) with the reduced
+	density matrices mixed over all states of sblocks,superblocks of the same blocks with different
+	targets,every state has the same weight.noise>0 adds the perturbation of SuperBlock.noise_blocks.
+	the results are stored on sblocks[0] as SuperBlock.truncate does,returns U,S,V
+	'''
+	sblock=sblocks[0]
+	weight=1./sum(len(sb.restricted_psis) for sb in sblocks)
+	lrho,rrho={},{}
+	parts=[sb.rho_blocks(weight) for sb in sblocks]
+	if noise>0.:
+		parts+=[sb.noise_blocks(noise*weight) for sb in sblocks]
+	for part in parts:
+		for rho,blocks in zip((lrho,rrho),part):
+			for sector,block in blocks.items():
+				rho[sector]=rho.get(sector,0.)+block
+	U,sblock.new_sector_array,evals,sblock.spectrum,sblock.discarded_weight=\
+		rho_truncate(lrho,sblock.lhgen.basis_by_sector,sblock.lhgen.D,m,tol)
+	V,sblock.rnew_sector_array,revals,sblock.rspectrum,sblock.rdiscarded_weight=\
+		rho_truncate(rrho,sblock.rhgen.basis_by_sector,sblock.rhgen.D,m,tol)
+	sblock.new_basis_by_sector=index_map(sblock.new_sector_array)
+	sblock.rnew_basis_by_sector=index_map(sblock.rnew_sector_array)
+	sblock.s=np.sqrt(evals)
+	return U,sblock.s,V
+
+def idmrg_guess(U,V,C,Cold,d,mirror=False):
+	'''
+	wavefunction prediction of the next infinite dmrg step(McCulloch,arXiv:0804.2509):(C.B).Cold^-1.(A.C)
+	U,V:transformation matrices of the last step,rows of U in (block,site) order,rows of V in (site,block)
+	order,or (block,site) order if the right block is a mirror
+	C:center matrix of the last step in the bases of U and V,Cold:center matrix of the step before
+	returns the guess as a dense (D_L,D_R) matrix of the next superblock
+	'''
+	D=Cold.shape[0]
+	A=U.toarray().reshape(D,d,-1) #a,s,alpha
+	if mirror:
+		B=V.toarray().reshape(D,d,-1).transpose(1,0,2) #s,b,beta
+	else:
+		B=V.toarray().reshape(d,D,-1)
+	X=np.tensordot(C,B,axes=(1,2)) #alpha,s1,b
+	Y=np.tensordot(A,C,axes=(2,0)) #a,s2,beta
+	X=np.tensordot(X,np.linalg.pinv(Cold,rcond=1e-8),axes=(2,0)) #alpha,s1,a
+	psi=np.tensordot(X,Y,axes=(2,0)) #alpha,s1,s2,beta
+	if mirror:
+		psi=psi.transpose(0,1,3,2)
+	return psi.reshape(X.shape[0]*d,-1)
+
+class IndexCache(object):
+	'''
+	least recently used cache of the restricted indices,(left sectors,right sectors,target)->restricted indices
+	construct:IndexCache(size=16)
+
+	a finite sweep meets every block layout once per direction,so a size of about 2L per target sector
+	keeps the layouts of one sweep for the next.
+	hits,misses:number of lookups found and not found
+	'''
+	def __init__(self,size=16):
+		self.size=size
+		self.items=OrderedDict()
+		self.hits=0
+		self.misses=0
+
+	def __len__(self):
+		return len(self.items)
+
+	def get(self,key):
+		'''the cached value of key(marked as recently used) or None'''
+		if key not in self.items:
+			self.misses+=1
+			return None
+		self.hits+=1
+		value=self.items.pop(key)
+		self.items[key]=value
+		return value
+
+	def put(self,key,value):
+		self.items[key]=value
+		if len(self.items)>self.size:
+			self.items.popitem(last=False)
+
+index_cache=IndexCache()
+
+def restricted_indices(lhgen,rhgen,target_sector,cache=None):
+	'''
+	indices of the superblock states in the target sector,cached per sector layout of the two blocks
+	cache:an IndexCache,default the module wide index_cache
+	returns {sys_sec:positions in the restricted basis},{env_sec:positions in the restricted basis}
+	and the restricted basis indices in the (lhgen.D*rhgen.D) superblock space
+	'''
+	cache=index_cache if cache is None else cache
+	key=(np.asarray(lhgen.basis_sector_array).tobytes(),np.asarray(rhgen.basis_sector_array).tobytes(),target_sector)
+	value=cache.get(key)
+	if value is not None:
+		return value
+	sector_indices={};rsector_indices={}
+	indices=[np.zeros(0,dtype=int)];offset=0
+	for sys_sec in sorted(lhgen.basis_by_sector.keys()):
+		env_sec=target_sector-sys_sec
+		if env_sec in rhgen.basis_by_sector:
+			sys_states=np.asarray(lhgen.basis_by_sector[sys_sec])
+			env_states=np.asarray(rhgen.basis_by_sector[env_sec])
+			indices.append(np.add.outer(sys_states*rhgen.D,env_states).ravel())
+			n=len(sys_states)*len(env_states)
+			sector_indices[sys_sec]=rsector_indices[env_sec]=np.arange(offset,offset+n)
+			offset+=n
+	value=(sector_indices,rsector_indices,np.concatenate(indices))
+	cache.put(key,value)
+	return value
+
+def select_states(weights,m,tol=0.):
+	'''
+	choose the m largest weights out of a list of blockwise weight arrays(each sorted descending),
+	fewer if the discarded weight stays below tol.
+	returns the number of kept states of each block and the discarded weight
+	'''
+	allvals=np.concatenate(weights)
+	owner=np.repeat(np.arange(len(weights)),[len(w) for w in weights])
+	my_m=min(len(allvals),m)
+	if tol>0.:
+		vals=np.sort(allvals)[::-1]
+		discarded=vals.sum()-np.cumsum(vals) #discarded weight when keeping 1,2,... states
+		my_m=min(my_m,1+np.count_nonzero(discarded>tol))
+	if my_m<len(allvals):
+		kept=np.argpartition(-allvals,my_m-1)[:my_m]
+	else:
+		kept=np.arange(len(allvals))
+	return np.bincount(owner[kept],minlength=len(weights)),allvals.sum()-allvals[kept].sum()
+
+def assemble(bases,vecs,nkept,D):
+	'''build the (D,sum(nkept)) transformation matrix from the kept columns of blockwise vectors'''
+	my_m=int(np.sum(nkept))
+	rows,cols,data=[np.zeros(0,dtype=int)],[np.zeros(0,dtype=int)],[np.zeros(0)]
+	offset=0
+	for basis,vec,n in zip(bases,vecs,nkept):
+		basis=np.asarray(basis)
+		rows.append(np.repeat(basis,n))
+		cols.append(np.tile(np.arange(offset,offset+n),len(basis)))
+		data.append(vec[:,:n].ravel())
+		offset+=n
+	return csr_matrix((np.concatenate(data),(np.concatenate(rows),np.concatenate(cols))),shape=(D,my_m))
+
+def rho_truncate(rho_block_dict,basis_by_sector,D,m,tol=0.):
+	'''
+	keep the m largest eigenstates of a sector-blocked density matrix,fewer if the discarded weight stays below tol
+	returns the (D,m) transformation matrix,the sector of each kept state,the kept eigenvalues,
+	the kept spectrum of each sector and the discarded weight
+	'''
+	sectors=sorted(rho_block_dict.keys())
+	evals,evecs=[],[]
+	for sector in sectors:
+		w,v=np.linalg.eigh(rho_block_dict[sector])
+		evals.append(np.maximum(w[::-1],0.));evecs.append(v[:,::-1])
+	nkept,discarded_weight=select_states(evals,m,tol)
+
+	transformation_matrix=assemble([basis_by_sector[sector] for sector in sectors],evecs,nkept,D)
+	new_sector_array=np.repeat(sectors,nkept).astype('d')
+	kept_evals=np.concatenate([w[:n] for w,n in zip(evals,nkept)])
+	spectrum=dict((sector,w[:n]) for sector,w,n in zip(sectors,evals,nkept) if n>0)
+	return transformation_matrix,new_sector_array,kept_evals,spectrum,discarded_weight
@@ -1,11 +1,17 @@
 from __future__ import division
 
+import os,json,shutil,tempfile
 import numpy as np
 from copy import copy,deepcopy
 
 from hgen import HGen
 from dmrg import DMRGEngine
 from ops import Op,Term,FTerm,SFTerm,oplib
+from blockstore import DiskBlockStore
+from eigsolve import EigenSolver
+from utils import tofmt
+from schedule import SweepSchedule
+from observer import Observer,PrintObserver,JSONObserver,ProfileObserver,CheckpointObserver
 
 J=1.
 t=-0.1
@@ -30,6 +36,109 @@ def test_fspin():
 	dmrg=DMRGEngine(lhgen,rhgen)
 	dmrg.finite(mwarmup=10,mlist=[10,20,30,40,40])
 	
+def test_fspin_disk():
+	with DMRGEngine(lhgen,rhgen,blockstore=lambda side:DiskBlockStore(side,cache=2)) as dmrg:
+		dmrg.finite(mwarmup=10,mlist=[10,20,30,40,40])
+		dmps=dmrg.tomps()
+		paths=[dmrg.lblocks.path,dmrg.rblocks.path]
+	print 'stores removed:',not any(os.path.exists(path) for path in paths)
+
+def test_solvers():
+	for method in ['davidson','lanczos','arpack']:
+		dmrg=DMRGEngine(lhgen,rhgen,solver=EigenSolver(method))
+		dmrg.finite(mwarmup=10,mlist=[10,20])
+		print method,'E=',dmrg.sblock.info
+
+def test_eigs(n=200,k=3): #excited states of a positive definite matrix,the locked states must not show up as zeros
+	A=np.random.rand(n,n)-0.5
+	H=A+A.T+n*np.identity(n)
+	E=np.linalg.eigvalsh(H)[:k]
+	for method in ['davidson','lanczos','arpack']:
+		Es,vs,info=EigenSolver(method).eigs(H.dot,[np.random.rand(n) for i in range(k)],diag=H.diagonal())
+		print method,'Es=',Es,'diff=',abs(Es-E).max(),'overlaps=',abs(np.array(vs).dot(np.array(vs).T)-np.identity(k)).max()
+
+def test_schedule():
+	schedule=SweepSchedule([10,20,40,40,40,40],tols=[1e-6,1e-8,1e-10],noises=[1e-4,1e-5,0.],max_truncs=1e-12,energy_tol=1e-9,trunc_tol=1e-10)
+	dmrg=DMRGEngine(lhgen,rhgen)
+	dmrg.finite(mwarmup=10,schedule=schedule)
+	print 'sweeps=',dmrg.sweep,'E=',dmrg.sweep_energies[-1]/dmrg.L,'errs=',dmrg.sweep_errs
+	#noise at m=40 on a longer chain,the enlarged blocks exceed dense_dim and the block operators are sparse
+	dmrg=DMRGEngine(HGen(sterms,20,part='left'),HGen(sterms,20,part='right'),observers=[])
+	dmrg.finite(mwarmup=40,schedule=SweepSchedule([40,40],noises=1e-4))
+	print 'L=20 noisy m=40 E=',dmrg.sweep_energies[-1]/dmrg.L
+
+def test_observers():
+	fd,path=tempfile.mkstemp(suffix='.json')
+	os.close(fd)
+	try:
+		dmrg=DMRGEngine(lhgen,rhgen,observers=[ProfileObserver(start=10,stop=12,nlines=10),PrintObserver(),JSONObserver(path)])
+		dmrg.finite(mwarmup=10,mlist=[10,20])
+		dmrg.close()
+		for line in open(path):
+			record=json.loads(line)
+			if 'time' in record:
+				print record['step'],record['direction'],record['site'],record['DL'],record['DR'],record['trunc_err'],\
+					record['nmatvec'],record.get('peak_memory'),' '.join('%s=%.2gs'%item for item in sorted(record['time'].items()))
+	finally:
+		os.remove(path)
+
+class Crash(Observer):
+	def step(self,engine,record):
+		if record['step']==23:
+			raise KeyboardInterrupt
+
+def test_checkpoint():
+	path=os.path.join(tempfile.mkdtemp(),'dmrg.ckpt')
+	try:
+		dmrg=DMRGEngine(lhgen,rhgen,observers=[CheckpointObserver(path,every=5),Crash()])
+		try:
+			dmrg.finite(mwarmup=10,mlist=[10,20,30,40])
+		except KeyboardInterrupt:
+			print 'stopped at step',dmrg.nstep,'sweep',dmrg.sweep,'phase',dmrg.phase
+		dmrg=DMRGEngine.resume(path,observers=[])
+		print 'resumed E=',dmrg.sweep_energies[-1]/dmrg.L,'steps=',dmrg.nstep
+		dmrg=DMRGEngine(lhgen,rhgen,observers=[])
+		dmrg.finite(mwarmup=10,mlist=[10,20,30,40])
+		print 'uninterrupted E=',dmrg.sweep_energies[-1]/dmrg.L,'steps=',dmrg.nstep
+	finally:
+		shutil.rmtree(os.path.dirname(path)) #also the .tmp of an interrupted write
+
+class CacheCount(Observer):
+	def sweep(self,engine,record):
+		print 'sweep',engine.sweep,'index cache hits',engine.index_cache.hits,'misses',engine.index_cache.misses
+
+def test_index_cache(): #the layouts of a sweep are met again in the next one,the misses stop growing with 2L entries
+	for size in [16,None]:
+		dmrg=DMRGEngine(HGen(sterms,24,part='left'),HGen(sterms,24,part='right'),observers=[CacheCount()],index_cache_size=size)
+		print 'index_cache_size=',dmrg.index_cache_size
+		dmrg.finite(mwarmup=60,mlist=[60,60,60])
+
+def test_targets():
+	dmrg=DMRGEngine(lhgen,rhgen,targets=[(0.,2),(1.,1)])
+	dmrg.finite(mwarmup=10,mlist=[20,30,40])
+	sx,sy,sz=np.array([[0,0.5],[0.5,0]]),np.array([[0,-0.5j],[0.5j,0]]),np.array([[0.5,0],[0,-0.5]])
+	H=0.;Sz=0.
+	for i in range(10):
+		Sz=Sz+np.kron(np.kron(np.identity(2**i),sz),np.identity(2**(9-i))).diagonal()
+		if i<9:
+			for s in [sx,sy,sz]:
+				H=H+J*np.kron(np.kron(np.identity(2**i),np.kron(s,s)),np.identity(2**(8-i))).real
+	for sector,k in dmrg.targets:
+		index=np.where(abs(Sz-sector)<1e-8)[0]
+		E=np.linalg.eigvalsh(H[index][:,index])[:k]
+		print 'sector=',sector,'dmrg=',dmrg.energies[sector],'exact=',E,'diff=',dmrg.energies[sector]-E
+
+def test_idmrg():
+	dmrg=DMRGEngine(lhgen,rhgen)
+	E=dmrg.idmrg(m=40,tol=1e-7)
+	print 'mirror E/bond=',E,'steps=',dmrg.nstep,'exact=',0.25-np.log(2)
+	dmrg=DMRGEngine(lhgen,rhgen)
+	E=dmrg.idmrg(m=40,tol=1e-7,mirror=False)
+	print 'E/bond=',E,'steps=',dmrg.nstep
+	field=Term([Op(oplib['sz'].mat,'sz',site=1)],param=0.1,label='Sz1')
+	print 'uniform field mirror:',HGen(sterms+[Term([oplib['sz']],param=0.1,label='Sz')],10).reflection() is not None,\
+		'field on site 1 mirror:',HGen(sterms+[field],10).reflection() is not None
+
 def test_ifermi():
 	dmrg=DMRGEngine(flhgen,frhgen)
 	dmrg.infinite(m=40)
@@ -38,6 +147,23 @@ def test_ffermi():
 	dmrg=DMRGEngine(flhgen,frhgen)	
 	dmrg.finite(mwarmup=10,mlist=[10,20,30,40,40])
 
+def test_fblocks(): #graded block hamiltonians against explicit jordan-wigner strings,with hoppings over 1 and 2 sites
+	L=6
+	terms=fterms+[FTerm([oplib['c+'],oplib['c']],param=0.6,dists=[2],label='C+*C 2'),FTerm([oplib['c'],oplib['c+']],param=-0.6,dists=[2],label='C*C+ 2')]
+	cs=[]
+	for j in range(L):
+		mat=np.array([[1.]])
+		for k in range(L):
+			mat=np.kron(mat,np.diag([-1.,1.]) if k<j else (oplib['c'].mat if k==j else np.identity(2)))
+		cs.append(mat)
+	H=sum(t*(cs[i].T.dot(cs[i+1])+cs[i+1].T.dot(cs[i])) for i in range(L-1))
+	H=H+sum(0.6*(cs[i].T.dot(cs[i+2])+cs[i+2].T.dot(cs[i])) for i in range(L-2))
+	for part in ['left','right']:
+		hgen=HGen(terms,L,part=part,fermi=True)
+		for i in range(L-1):
+			hgen.enlarge()
+		print part,abs(tofmt(hgen.H,np.inf)-H).max()
+
 def test_isfermi():
 	dmrg=DMRGEngine(fslhgen,fsrhgen)
 	dmrg.infinite(m=40)
@@ -4,6 +4,8 @@ from scipy.sparse import identity
 from copy import deepcopy
 
 from mps import MPS,ket2mps,overlap,expect
+from measure import Measurer,lstep
+from transfer import transfer_eigs,correlation_lengths,entanglement,canonical_bonds
 from dmrg import DMRGEngine
 from testdmrg import lhgen,rhgen
 
@@ -20,9 +22,14 @@ for i in range(3):
 def test_tomps():
 	dmrg=DMRGEngine(lhgen,rhgen)  
 	dmrg.finite(mwarmup=10,mlist=[10])
-	dmps=dmrg.tomps()
+	dmps=dmrg.tomps(qns=True)
 	return dmps
 
+def test_qns(mps): #every nonzero element must conserve the quantum numbers
+	for i,M in enumerate(mps.Ms):
+		a,s,b=np.nonzero(abs(M)>1e-12)
+		print np.abs(mps.bond_qns[i][a]+mps.site_qns[s]-mps.bond_qns[i+1][b]).max()
+
 def test_shape(mps):
 	for M in mps.Ms:
 		print M.shape
@@ -55,11 +62,60 @@ def test_expect():
 	print expect(mps,opl)
 	print ket.conjugate().transpose().dot(OP).dot(ket)
 
+def test_measure():
+	sz=np.array([[0.5,0.],[0.,-0.5]]);sp=np.array([[0.,1.],[0.,0.]]);Z=np.array([[1.,0.],[0.,-1.]])
+	mps=ket2mps(ket,2,4,cano='mixed',div=2)
+	measurer=Measurer(mps)
+	def op(mats): #operator on the chain from a list of site matrices
+		res=np.array([[1.]])
+		for mat in mats:
+			res=np.kron(res,mat)
+		return res
+	norm=ket.dot(ket)
+	ones=measurer.expect([sz,sp])
+	for i in range(4):
+		for k,O in enumerate([sz,sp]):
+			print ones[k,i]-ket.dot(op([O if l==i else np.identity(2) for l in range(4)])).dot(ket)/norm
+	C=measurer.correlation([sp,sp.T],string=Z)
+	for i in range(4):
+		for j in range(i+1,4):
+			mats=[np.identity(2)]*i+[sp.T]+[Z]*(j-i-1)+[sp]+[np.identity(2)]*(3-j)
+			print C[1,0,i,j]-ket.dot(op(mats)).dot(ket)/norm
+
+def test_entanglement():
+	L=6
+	ket=np.random.rand(2**L)
+	mps=ket2mps(ket,2,L,cano='mixed',div=2)
+	Ses,spectra=entanglement(mps)
+	As,Bs,Ss=canonical_bonds(mps)
+	test_cano(MPS(2,L,As,Bs))
+	for l in range(1,L):
+		S=np.linalg.svd(ket.reshape(2**l,-1),compute_uv=False)
+		p=S**2/np.sum(S**2)
+		print Ses[l]+np.sum(p*np.log(p)),spectra[l][0]+np.log(p[0])
+	dmrg=DMRGEngine(lhgen,rhgen,observers=[])
+	dmrg.finite(mwarmup=10,mlist=[10])
+	Ses,spectra=entanglement(dmrg.tomps())
+	print 'dmrg spectra sorted:',all(np.all(np.diff(spectrum)>=0) for spectrum in spectra),spectra[dmrg.L/2][:6]
+
+def test_transfer():
+	m,d=6,2
+	M=np.random.rand(m,d,m)+1j*np.random.rand(m,d,m)
+	T=np.zeros((m*m,m*m),dtype=complex) #dense transfer matrix for comparison
+	for k,e in enumerate(np.identity(m*m)):
+		T[:,k]=lstep(e.reshape(m,m),M).ravel()
+	vals=np.linalg.eigvals(T)
+	vals=vals[np.argsort(-abs(vals))]
+	print abs(transfer_eigs([M],k=4))-abs(vals[:4])
+	print abs(transfer_eigs([M,M],k=4))-abs(vals[:4])**2
+	xis,evals=correlation_lengths([M,M],k=3)
+	print xis+1./np.log(abs(vals[1:3]/vals[0]))
 
 if __name__=='__main__':
 	#dmps=test_tomps()
 	#test_shape(dmps)
 	#test_cano(dmps)
+	#test_qns(dmps)
 	#test_toket()
 	#test_overlap()
 	#test_shift(mps)
@@ -0,0 +1,101 @@
+'''
+transfer matrix and entanglement analysis of an mps
+
+the transfer matrix of a cell of site tensors acts on left environments X[a,a'](bra index first) as
+X->sum_s M^s^dagger X M^s,it is applied matrix free(measure.lstep) and only its dominant eigenvalues are
+computed by arnoldi iterations,so the m^2 x m^2 matrix is never formed.
+'''
+import numpy as np
+from scipy.sparse.linalg import eigs,LinearOperator
+
+from measure import lstep
+
+def transfer_operator(Ms):
+	'''transfer matrix of the cell of site tensors Ms as a LinearOperator on flattened X[a,a']'''
+	m=Ms[0].shape[0]
+	if Ms[-1].shape[-1]!=m:
+		raise ValueError('the cell maps bond dimension %s to %s'%(m,Ms[-1].shape[-1]))
+	dtype=np.result_type(*Ms)
+	def matvec(x):
+		X=x.reshape(m,m)
+		for M in Ms:
+			X=lstep(X,M)
+		return X.ravel()
+	return LinearOperator((m*m,m*m),matvec=matvec,dtype=dtype)
+
+def transfer_eigs(Ms,k=4,tol=0.,v0=None):
+	'''
+	k dominant eigenvalues of the transfer matrix of the cell Ms,sorted by decreasing modulus
+	v0:start vector,e.g. the identity for left canonical tensors
+	'''
+	T=transfer_operator(Ms)
+	n=T.shape[0]
+	if k>=n-1: #too small for arnoldi,apply the operator to the unit vectors
+		vals=np.linalg.eigvals(np.array([T.matvec(e) for e in np.identity(n,dtype=T.dtype)]).T)
+	else:
+		vals=eigs(T,k=k,which='LM',tol=tol,v0=v0,return_eigenvectors=False)
+	return vals[np.argsort(-abs(vals))][:k]
+
+def correlation_lengths(Ms,k=4,tol=0.):
+	'''
+	correlation lengths(in sites) xi_i=-n/log|lambda_i/lambda_0| of the cell Ms of n sites from the k dominant
+	eigenvalues of its transfer matrix,returns the k-1 lengths and the eigenvalues
+	'''
+	vals=transfer_eigs(Ms,k,tol)
+	with np.errstate(divide='ignore'):
+		xis=-len(Ms)/np.log(abs(vals[1:]/vals[0]))
+	return xis,vals
+
+def canonical_bonds(mps):
+	'''
+	one sweep from the center of a mixed canonical mps(As,S,Bs) to both ends
+	returns the left canonical tensors of all sites,the right canonical tensors of all sites and the
+	schmidt values Ss of every bond,Ss[l] belongs to the cut after l sites(Ss[0],Ss[L] are the norm)
+	'''
+	if mps.S is None or hasattr(mps,'Psi'):
+		raise ValueError('mps has no schmidt values at its center,call it before contract_s')
+	d=mps.d
+	nl=len(mps.As)
+	Ss=[None]*(nl+len(mps.Bs)+1)
+	Ss[nl]=mps.S
+	Bs=list(mps.Bs)
+	C=np.diag(mps.S) #center bond matrix,moving left
+	for i in range(nl-1,-1,-1):
+		T=np.tensordot(mps.As[i],C,1)
+		U,S,Vdag=np.linalg.svd(T.reshape(T.shape[0],-1),full_matrices=False)
+		Bs.insert(0,Vdag.reshape(-1,d,T.shape[-1]))
+		Ss[i]=S
+		C=U*S
+	As=list(mps.As)
+	C=np.diag(mps.S) #moving right
+	for i,B in enumerate(mps.Bs):
+		T=np.tensordot(C,B,1)
+		U,S,Vdag=np.linalg.svd(T.reshape(-1,T.shape[-1]),full_matrices=False)
+		As.append(U.reshape(T.shape[0],d,-1))
+		Ss[nl+i+1]=S
+		C=S[:,None]*Vdag
+	return As,Bs,Ss
+
+def entropy(S,alpha=1):
+	'''von neumann(alpha=1) or renyi entropy of the schmidt values S'''
+	p=S**2/np.sum(S**2)
+	p=p[p>1e-300]
+	if alpha==1:
+		return -np.sum(p*np.log(p))
+	return np.log(np.sum(p**alpha))/(1-alpha)
+
+def entanglement_spectrum(S):
+	'''entanglement energies -log(p) of the schmidt values S,in increasing order'''
+	p=S**2/np.sum(S**2)
+	return np.sort(-np.log(p[p>1e-300])) #the center bond of a dmrg state is grouped by sectors
+
+def entanglement(mps,alpha=1):
+	'''entropies(array of L+1) and entanglement spectra(list of L+1) of all bonds of a mixed canonical mps'''
+	As,Bs,Ss=canonical_bonds(mps)
+	return np.array([entropy(S,alpha) for S in Ss]),[entanglement_spectrum(S) for S in Ss]
+
+def bulk_cell(mps,n=1):
+	'''left canonical tensors of the n sites in the middle of the mps,a cell for the transfer matrix'''
+	As,Bs,Ss=canonical_bonds(mps)
+	start=(mps.L-n)/2
+	return As[start:start+n]
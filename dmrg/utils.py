@@ -1,6 +1,44 @@
+import numpy as np
+from scipy.sparse import kron,issparse,csr_matrix,coo_matrix,diags
+
 def index_map(array):
-    d = {}
-    for index, value in enumerate(array):
-        d.setdefault(value, []).append(index)
-    return d
+	d = {}
+	for index, value in enumerate(array):
+		d.setdefault(value, []).append(index)
+	return d
+
+def tofmt(mat,dense_dim):
+	'''block operators are dense arrays up to dimension dense_dim and csr matrices above'''
+	if mat.shape[0]<=dense_dim:
+		return mat.toarray() if issparse(mat) else np.asarray(mat)
+	return csr_matrix(mat)
+
+def fkron(a,b,dense_dim):
+	'''kron product in the block operator format'''
+	if a.shape[0]*b.shape[0]<=dense_dim:
+		return np.kron(tofmt(a,np.inf),tofmt(b,np.inf))
+	return kron(a,b,format='csr')
+
+def psign(mat,signs):
+	'''mat.diag(signs),the fermionic sign of an odd operator passing a block of parities signs'''
+	if issparse(mat):
+		return csr_matrix(mat.dot(diags(signs)))
+	return np.asarray(mat)*signs
+
+def transform_parity(parity,T):
+	'''parities of the columns of T,every kept state lies in one sector and so has a definite parity'''
+	weights=abs(T)
+	weights=weights.multiply(weights) if issparse(weights) else weights*weights
+	result=np.ravel(weights.T.dot(parity))
+	assert(np.allclose(abs(result),1.,atol=1e-6)) #a column mixing both parities
+	return np.sign(result)
 
+def block_sum(mats,D,dense_dim):
+	'''sum a list of block operators,above dense_dim with a single coo build'''
+	if D<=dense_dim:
+		return sum([tofmt(mat,np.inf) for mat in mats],np.zeros((D,D)))
+	mats=[coo_matrix(mat) for mat in mats]
+	row=np.concatenate([np.zeros(0,dtype=int)]+[mat.row for mat in mats])
+	col=np.concatenate([np.zeros(0,dtype=int)]+[mat.col for mat in mats])
+	data=np.concatenate([np.zeros(0)]+[mat.data for mat in mats])
+	return coo_matrix((data,(row,col)),shape=(D,D)).tocsr()
@@ -0,0 +1,233 @@
+'''
+time evolving block decimation(tebd) of a finite chain and its infinite version(itebd)
+
+the state is kept in the vidal form as right canonical tensors B[a,s,b]=Gamma[a,s,b].Lambda[b] and the schmidt
+values LL of all bonds,LL[i] sits left of site i.vidal() gives the Gamma matrices and the schmidt values in the
+layout of VidalMPS(GL,LL) in giggleliu/mps.
+
+one trotter step of exp(-dt H) is a sequence of layers of two-site gates exp(-f dt h) on the even(0-1,2-3,...)
+or on the odd bonds.a real dt evolves in imaginary time,dt=1j*t in real time.a bond update costs O(m^3 d^3),
+a step O(L m^3 d^3).
+'''
+import numpy as np
+from scipy.linalg import expm
+from multiprocessing.pool import ThreadPool
+
+def merge_layers(layers):
+	'''join neighbouring layers on bonds of the same parity'''
+	merged=[]
+	for parity,f in layers:
+		if merged and merged[-1][0]==parity:
+			merged[-1]=(parity,merged[-1][1]+f)
+		else:
+			merged.append((parity,f))
+	return merged
+
+def trotter_layers(order=2):
+	'''
+	(bond parity,fraction of dt) of the layers of one trotter step
+	order 2:e^{-dt H_even/2}e^{-dt H_odd}e^{-dt H_even/2},order 4:suzuki's composition of five second order steps
+	'''
+	if order==2:
+		return [(0,0.5),(1,1.),(0,0.5)]
+	elif order==4:
+		p=1./(4-4**(1./3))
+		return merge_layers([(parity,f*x) for x in [p,p,1-4*p,p,p] for parity,f in trotter_layers(2)])
+	raise ValueError('trotter order must be 2 or 4')
+
+def bond_update(lam,B1,B2,gate,m,tol=0.):
+	'''
+	apply gate[s1,s2,s1',s2'] to the right canonical tensors B1,B2 with the schmidt values lam on the left
+	returns the new B1,the schmidt values between them,the new B2 and the discarded weight.
+	B1 is recovered as theta.B2^dagger(hastings),no schmidt values are inverted.
+	'''
+	a,d,c=B1.shape[0],B1.shape[1],B2.shape[2]
+	theta=np.tensordot(np.tensordot(B1,B2,axes=(2,0)),gate,axes=([1,2],[2,3])).transpose(0,2,3,1) #a,s1,s2,c
+	U,S,Vdag=np.linalg.svd((lam[:,None]*theta.reshape(a,-1)).reshape(a*d,d*c),full_matrices=False)
+	weights=S**2
+	total=weights.sum()
+	n=min(m,np.count_nonzero(S>1e-14*S[0]))
+	if tol>0.:
+		discarded=total-np.cumsum(weights) #discarded weight when keeping 1,2,... states
+		n=min(n,1+np.count_nonzero(discarded>tol*total))
+	norm=np.sqrt(weights[:n].sum())
+	B2=Vdag[:n].reshape(n,d,c)
+	B1=np.tensordot(theta,B2.conjugate(),axes=([2,3],[1,2]))/norm
+	return B1,S[:n]/norm,B2,1.-weights[:n].sum()/total
+
+def product_state(states,d):
+	'''Bs,LL of the product state of the site states(indices)'''
+	Bs=[]
+	for s in states:
+		B=np.zeros((1,d,1))
+		B[0,s,0]=1.
+		Bs.append(B)
+	return Bs,[np.ones(1) for i in range(len(states)+1)]
+
+class TEBD(object):
+	'''
+	tebd of a finite chain,the bonds of one layer are independent and are updated in parallel in a thread pool
+	construct:TEBD(Bs,LL,hs,m,tol=0.,order=2,nthreads=None)
+
+	Bs:right canonical tensors B[a,s,b],LL:schmidt values of the L+1 bonds including the two boundaries
+	hs:bond hamiltonian(a d^2 x d^2 matrix) of all bonds,or a list of the hamiltonians of every bond
+	m:maximum number of kept states,tol:maximum discarded weight of a bond update
+	the gates are cached per (bond type,dt),a bond type is one of the distinct bond hamiltonians.
+	the thread pool is created by the first layer,close() or a with statement stops its threads.
+	'''
+	infinite=False
+
+	def __init__(self,Bs,LL,hs,m,tol=0.,order=2,nthreads=None):
+		self.Bs=list(Bs)
+		self.LL=list(LL)
+		self.L=len(self.Bs)
+		self.d=self.Bs[0].shape[1]
+		self.nbond=self.L if self.infinite else self.L-1
+		self.hs=[] #distinct bond hamiltonians
+		self.btypes=[] #bond type of every bond
+		for h in (hs if isinstance(hs,(list,tuple)) else [hs]*self.nbond):
+			h=np.asarray(h)
+			for k,h0 in enumerate(self.hs):
+				if h0.shape==h.shape and np.allclose(h0,h):
+					break
+			else:
+				k=len(self.hs)
+				self.hs.append(h)
+			self.btypes.append(k)
+		self.m=m
+		self.tol=tol
+		self.order=order
+		self.gates={}
+		self.nthreads=nthreads
+		self.pool=None
+		self.trunc_err=0.
+		self.t=0.
+
+	def close(self):
+		'''stop the threads of the pool'''
+		if self.pool is not None:
+			self.pool.close()
+			self.pool.join()
+			self.pool=None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*exc):
+		self.close()
+
+	def gate(self,btype,dt):
+		'''exp(-dt h) of the bond type as a [s1,s2,s1',s2'] tensor'''
+		key=(btype,dt)
+		if key not in self.gates:
+			d=self.d
+			self.gates[key]=expm(-dt*self.hs[btype]).reshape(d,d,d,d)
+		return self.gates[key]
+
+	def bonds(self,parity):
+		return range(parity,self.nbond,2)
+
+	def update(self,i,gate):
+		'''apply the gate to the bond between site i and i+1'''
+		j=(i+1)%self.L
+		self.Bs[i],self.LL[j],self.Bs[j],err=bond_update(self.LL[i],self.Bs[i],self.Bs[j],gate,self.m,self.tol)
+		return err
+
+	def layer(self,parity,dt):
+		'''evolve all bonds of a parity by exp(-dt h)'''
+		bonds=self.bonds(parity)
+		gates=[self.gate(self.btypes[i],dt) for i in bonds] #filled before the threads start
+		if self.pool is None:
+			self.pool=ThreadPool(self.nthreads)
+		errs=self.pool.map(lambda args:self.update(*args),zip(bonds,gates))
+		self.trunc_err+=sum(errs)
+
+	def evolve(self,dt,nsteps=1):
+		'''nsteps trotter steps of exp(-dt H),the half layers at the joints of two steps are merged'''
+		for parity,f in merge_layers(trotter_layers(self.order)*nsteps):
+			self.layer(parity,f*dt)
+		self.t+=nsteps*dt
+		if np.real(dt)!=0 and not self.infinite: #imaginary time gates are not unitary and spoil the canonical form
+			self.canonicalize()
+
+	def canonicalize(self):
+		'''restore the right canonical form and the schmidt values,a qr sweep to the right and an svd sweep back'''
+		M=np.ones((1,1))
+		As=[]
+		for B in self.Bs:
+			B=np.tensordot(M,B,1)
+			Q,M=np.linalg.qr(B.reshape(-1,B.shape[-1]))
+			As.append(Q.reshape(B.shape[0],self.d,-1))
+		C=M/np.linalg.norm(M)
+		for i in range(self.L-1,-1,-1):
+			T=np.tensordot(As[i],C,1)
+			U,S,Vdag=np.linalg.svd(T.reshape(T.shape[0],-1),full_matrices=False)
+			self.Bs[i]=Vdag.reshape(-1,self.d,T.shape[-1])
+			self.LL[i]=S/np.linalg.norm(S)
+			C=U*S
+		self.LL[0]=np.ones(1)
+		self.Bs[0]=self.Bs[0]*C[0,0]/abs(C[0,0]) #keep the global phase
+
+	def theta(self,i):
+		'''two-site wavefunction[a,s1,s2,c] of the bond i'''
+		j=(i+1)%self.L
+		return np.tensordot(self.LL[i][:,None,None]*self.Bs[i],self.Bs[j],axes=(2,0))
+
+	def bond_energies(self):
+		d=self.d
+		Es=[]
+		for i in range(self.nbond):
+			theta=self.theta(i).transpose(1,2,0,3).reshape(d*d,-1)
+			Es.append(np.vdot(theta,self.hs[self.btypes[i]].dot(theta)).real)
+		return np.array(Es)
+
+	def energy(self):
+		return self.bond_energies().sum()
+
+	def expect(self,op):
+		'''<op> of every site'''
+		res=[]
+		for i in range(self.L):
+			psi=self.LL[i][:,None,None]*self.Bs[i]
+			res.append(np.tensordot(psi.conjugate(),np.tensordot(psi,op,axes=(1,1)),axes=([0,1,2],[0,2,1])))
+		return np.array(res)
+
+	def ground_state(self,dts=(0.1,0.01,0.001),tol=1e-10,nsteps=10,maxstep=10000):
+		'''imaginary time evolution with decreasing steps dts,each until the energy changes by less than tol'''
+		E=self.energy()
+		for dt in dts:
+			for step in range(0,maxstep,nsteps):
+				self.evolve(dt,nsteps)
+				Eold,E=E,self.energy()
+				if abs(E-Eold)<tol:
+					break
+		return E
+
+	def vidal(self):
+		'''Gamma matrices G[s,a,b] and the inner schmidt values,the GL,LL of VidalMPS'''
+		GL=[]
+		for i,B in enumerate(self.Bs):
+			lam=self.LL[(i+1)%len(self.LL)]
+			GL.append((B*np.where(lam>1e-14,1./np.maximum(lam,1e-14),0.)).transpose(1,0,2))
+		return GL,self.LL if self.infinite else self.LL[1:-1]
+
+	def toket(self):
+		ket=np.ones((1,1))
+		for B in self.Bs:
+			ket=np.tensordot(ket,B,1)
+		return ket.ravel()
+
+class ITEBD(TEBD):
+	'''
+	itebd of an infinite chain with the unit cell A,B,the even layer updates the bond A-B and the odd one B-A
+	construct:ITEBD(Bs,LL,hs,m,tol=0.,order=2)
+
+	Bs:[B_A,B_B],LL:[schmidt values of B-A,of A-B],hs:bond hamiltonian of both bonds or [h_AB,h_BA]
+	in imaginary time the canonical form is not restored,the energies carry an error O(dt) that the decreasing
+	steps of ground_state remove.
+	'''
+	infinite=True
+
+	def energy(self):
+		'''energy per bond'''
+		return self.bond_energies().mean()
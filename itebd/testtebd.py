@@ -0,0 +1,46 @@
+import threading
+import numpy as np
+from scipy.linalg import expm
+
+from tebd import TEBD,ITEBD,product_state,trotter_layers
+
+sz=np.array([[0.5,0.],[0.,-0.5]]);sp=np.array([[0.,1.],[0.,0.]])
+h=np.kron(sz,sz)+0.5*(np.kron(sp,sp.T)+np.kron(sp.T,sp)) #heisenberg bond
+
+def chain_hamiltonian(L):
+	H=0.
+	for i in range(L-1):
+		H=H+np.kron(np.kron(np.identity(2**i),h),np.identity(2**(L-i-2)))
+	return H
+
+def test_layers():
+	for order in [2,4]:
+		layers=trotter_layers(order)
+		print order,len(layers),sum(f for parity,f in layers if parity==0),sum(f for parity,f in layers if parity==1)
+
+def test_ground_state(L=8):
+	with TEBD(*product_state([0,1]*(L/2),2),hs=h,m=20) as tebd:
+		E=tebd.ground_state()
+	print 'tebd E=',E,'exact=',np.linalg.eigvalsh(chain_hamiltonian(L))[0],'gates=',len(tebd.gates)
+
+def test_quench(L=8,t=1.):
+	Bs,LL=product_state([0,1]*(L/2),2)
+	ket=TEBD(Bs,LL,h,m=16).toket()
+	exact=expm(-1j*t*chain_hamiltonian(L)).dot(ket)
+	for order in [2,4]:
+		for dt in [0.1,0.05]:
+			with TEBD(Bs,LL,hs=h,m=16,order=order) as tebd:
+				tebd.evolve(1j*dt,int(round(t/dt)))
+			print 'order',order,'dt',dt,'|psi-psi_exact|=',np.linalg.norm(tebd.toket()-exact)
+
+def test_itebd():
+	with ITEBD(*product_state([0,1],2),hs=h,m=30) as itebd:
+		E=itebd.ground_state()
+	print 'itebd E/bond=',E,'exact=',0.25-np.log(2),'<sz>=',itebd.expect(sz).real
+
+if __name__=='__main__':
+	test_layers()
+	test_ground_state()
+	test_quench()
+	test_itebd()
+	print 'threads left:',threading.active_count()
@@ -1,26 +1,42 @@
 import numpy as np
 
-#change to sparse form later
+'''
+quantum number markers of tensor axes
+
+a marker either lists the quantum number of every index of an axe(before compact),
+or the quantum numbers of the blocks of that axe together with the block sizes(after compact).
+sign is +1 for an incoming axe and -1 for an outgoing one,a block-sparse tensor only keeps
+blocks whose charges satisfy sum(sign*qn)==Q.
+'''
 
 class Marker(object):
-	def __init__(self,qns,sizes=[],divs=[],sign=None,Q='M'):
-		self.qns=qns #quantum numbers of each block
-		self.sizes=sizes #sizes of each block.meaningless before blockize
-		self.divs=divs #divs of each block.meaningless before blockize
-		self.sign=sign #to be determined later for each axes
+	def __init__(self,qns,sizes=[],divs=[],sign=1,Q='M'):
+		self.qns=list(qns) #quantum numbers of each block
+		self.sizes=list(sizes) if len(sizes) else [1]*len(self.qns) #sizes of each block
+		self.divs=list(divs) if len(divs) else list(np.cumsum(self.sizes)[:-1]) #divs of each block
+		self.sign=sign
 		self.Q=Q
+		self.sub=None #markers of the axes merged into this one
+		self.parts=None #{qn:[(qn1,qn2,offset)]},positions of the merged sub-blocks
+
+	@property
+	def dim(self):
+		return int(sum(self.sizes))
+
+	def offsets(self):
+		return [0]+[int(div) for div in self.divs]
 
-	def reorder(self):
-		perm=list(np.range(len(self.qns)))
-		qns_perm=[(qn,per) for qn in self.qns for per in perm]
-		qns_perm=sorted(qns_perm key=lamda x:x[0])
-		self.qns=[]
-		perm=[]
-		for qn,per in qns_perm:
-			self.qns.append(qn)
-			perm.append(per)
+	def index(self,qn):
+		return self.qns.index(qn)
+
+	def size(self,qn):
+		return self.sizes[self.qns.index(qn)]
+
+	def reorder(self): #stable sort of the indices by quantum number
+		perm=list(np.argsort(np.array(self.qns),kind='mergesort'))
+		self.qns=[self.qns[per] for per in perm]
 		return perm
-		
+
 	def compact(self): #after reorder
 		q=self.qns[0]
 		qs=[];qs.append(q)
@@ -31,16 +47,47 @@ class Marker(object):
 				self.sizes.append(1)
 			else:
 				self.sizes[-1]+=1
-		self.qns=qs	
+		self.qns=qs
 		self.divs=[]
 		size=0
 		for i in range(len(self.sizes)-1):
 			self.divs.append(size+self.sizes[i])
 			size+=self.sizes[i]
 
+	def flip(self):
+		mk=Marker(self.qns,self.sizes,self.divs,-self.sign,self.Q)
+		mk.sub=self.sub;mk.parts=self.parts
+		return mk
+
+def blockize(qns,sign=1): #compact marker of an index-wise quantum number array and the permutation to get there
+	mk=Marker(qns,sign=sign)
+	perm=mk.reorder()
+	mk.compact()
+	return mk,perm
+
 def bcadd(mk1,mk2):
-	marker=Marker([])
-	marker.qns=list((np.array(mk1.qns)[:,np.newaxis]+np.array(marker.qns)).flatten()) #sign?
+	marker=Marker([],sign=mk1.sign)
+	marker.qns=list((np.array(mk1.qns)[:,np.newaxis]+np.array(mk2.qns)*mk2.sign*mk1.sign).flatten())
+	marker.sizes=[1]*len(marker.qns)
+	marker.divs=list(np.arange(1,len(marker.qns)))
+	return marker
+
+def fuse(mk1,mk2): #merge two compact markers,the merged axe has the sign of mk1
+	parts={}
+	for q1,n1 in zip(mk1.qns,mk1.sizes):
+		for q2,n2 in zip(mk2.qns,mk2.sizes):
+			q=q1+q2*mk2.sign*mk1.sign
+			parts.setdefault(q,[]).append([q1,q2,n1*n2])
+	qns=sorted(parts.keys())
+	sizes=[]
+	for q in qns:
+		offset=0
+		for part in parts[q]:
+			n=part[2];part[2]=offset;offset+=n
+		sizes.append(offset)
+	marker=Marker(qns,sizes,sign=mk1.sign)
+	marker.sub=(mk1,mk2)
+	marker.parts=dict((q,[tuple(part) for part in parts[q]]) for q in qns)
 	return marker
 
 sz_in=Marker([1,-1],[1,1],[1],1)
@@ -52,16 +99,19 @@ class MarkerGen(object): #marker generator of a  mps/mpo chain
 		self.M=M
 		self.L=L
 		self.l=0
-		
+
 	def enlarge(self,markers): #enlarge one site
 		for marker in markers:
-			self.marker.qns=list((np.array(self.marker.qns)[:,np.newaxis]+np.array(marker.qns*marker.sign)).flatten())
+			self.marker.qns=list((np.array(self.marker.qns)[:,np.newaxis]+np.array(marker.qns)*marker.sign).flatten())
+		self.marker.sizes=[1]*len(self.marker.qns)
+		self.marker.divs=list(np.arange(1,len(self.marker.qns)))
 		self.l+=1
-			
+
 	def filt(self):
 		qs=[]
 		for qn in self.marker.qns:
 			if qn+(self.L-self.l)>=self.M and qn-(self.L-self.l)<=self.M:
 				qs.append(qn)
-			self.marker.qns=qs
-				
+		self.marker.qns=qs
+		self.marker.sizes=[1]*len(qs)
+		self.marker.divs=list(np.arange(1,len(qs)))
@@ -2,6 +2,7 @@ import numpy as np
 from copy import deepcopy
 
 from mps import MPS
+from vmps import lupdate,rupdate,svd_truncate,right_canonical
 
 class MPO(object):
 	def __init__(self,d,L,Ws=[]):
@@ -10,57 +11,241 @@ class MPO(object):
 		self.D=self.d**2
 		self.L=L		
 
-	def compress(self,m): #remain m largest value
-		o=np.array([[[1.]]])
-		for l in range(self.L):
-			self.Ws[l]=np.tensordot(o,self.Ws[l],1)
-			self.Ws[l].reshape(-1,self.Ws[l][-1]) #blockize
-			U,S,Vdag=np.svd(self.Ws[l],full_matrices=False)
-			W=U.reshape(-1,self.d,self.d,U.shape[-1])
-			S.sort()
-			S=S[:m] #renormalize?		
-			o=np.tensordot(np.diag(S),Vdag,1)
+	def __add__(self,other):
+		return add(self,other)
+
+	def __sub__(self,other):
+		return add(self,scale(other,-1.))
+
+	def __mul__(self,other):
+		'''a scalar,an mpo(operator product) or an mps(mpo applied to it)'''
+		if isinstance(other,MPO):
+			return prod(self,other)
+		elif isinstance(other,MPS):
+			return act(self,other)
+		return scale(self,other)
+
+	def __rmul__(self,c):
+		return scale(self,c)
+
+	def deparallelize(self,tol=1e-12):
+		'''
+		exact compression:zero and parallel columns of every W(rows in the sweep back) are merged into one,
+		the factors go to the next W.this keeps the state machine structure without rounding errors
+		'''
+		self.Ws=deparallelize(self.Ws,tol)
+		return self
+
+	def compress(self,m=None,tol=1e-12):
+		'''
+		deparallelize,then svd compression:a qr sweep to the right and an svd sweep back keeping at most m
+		singular values above tol times the largest one of every bond.the svd result is only taken if it
+		lowers a bond dimension,otherwise the exact deparallelized mpo is kept.
+		the norm taken out of every bond is collected as a power of two(an exact rescaling) and spread
+		evenly over all sites,so no W over- or underflows on long chains.
+		the sweeps work on a new list,self.Ws is only replaced at the end.a zero mpo becomes zero W of bond dimension 1
+		'''
+		Ws0=deparallelize(self.Ws,tol)
+		if not all(np.any(W) for W in Ws0):
+			self.Ws=[np.zeros((1,)+W.shape[1:3]+(1,),dtype=W.dtype) for W in Ws0]
+			return self
+		Ws=list(Ws0)
+		k=0
+		for l in range(self.L-1):
+			W=Ws[l]
+			Q,R=np.linalg.qr(W.reshape(-1,W.shape[-1]))
+			e=np.frexp(np.linalg.norm(R))[1]
+			k+=e
+			Ws[l]=Q.reshape(W.shape[:3]+(-1,))
+			Ws[l+1]=np.tensordot(R*2.**-e,Ws[l+1],1)
+		for l in range(self.L-1,0,-1):
+			W=Ws[l]
+			U,S,Vdag,err=svd_truncate(W.reshape(W.shape[0],-1),W.shape[0] if m is None else m,tol,normalize=False)
+			n=len(S)
+			e=np.frexp(np.linalg.norm(S))[1]
+			k+=e
+			Ws[l]=Vdag.reshape((n,)+W.shape[1:])
+			Ws[l-1]=np.tensordot(Ws[l-1],U*(S*2.**-e),1)
+		if any(W.shape[-1]<W0.shape[-1] for W,W0 in zip(Ws,Ws0)):
+			q,r=divmod(k,self.L)
+			Ws0=[W*2.**(q+(l<r)) for l,W in enumerate(Ws)]
+		self.Ws=Ws0
+		return self
+
+def deparallelize(Ws,tol=1e-12):
+	'''the exact compression of MPO.deparallelize on a new list of W'''
+	Ws=list(Ws)
+	for l in range(len(Ws)-1):
+		W=Ws[l]
+		kept,T=parallel(W.reshape(-1,W.shape[-1]),tol)
+		Ws[l]=W[...,kept]
+		Ws[l+1]=np.tensordot(T,Ws[l+1],1)
+	for l in range(len(Ws)-1,0,-1):
+		W=Ws[l]
+		kept,T=parallel(W.reshape(W.shape[0],-1).T,tol)
+		Ws[l]=W[kept]
+		Ws[l-1]=np.tensordot(Ws[l-1],T.T,1)
+	return Ws
+
+def parallel(M,tol=1e-12):
+	'''
+	columns kept and the matrix T with M=M[:,kept].T,a column parallel to a kept one(up to tol relative)
+	is replaced by a factor in T,a zero column is dropped
+	'''
+	norms=np.sqrt((abs(M)**2).sum(axis=0))
+	zero=tol*max(norms.max(),1e-300)
+	kept=[]
+	T=np.zeros((M.shape[1],M.shape[1]),dtype=M.dtype)
+	for j in range(M.shape[1]):
+		if norms[j]<=zero:
+			continue
+		for k,i in enumerate(kept):
+			p=np.argmax(abs(M[:,i]))
+			c=M[p,j]/M[p,i]
+			if np.linalg.norm(M[:,j]-c*M[:,i])<=tol*norms[j]:
+				T[k,j]=c
+				break
+		else:
+			T[len(kept),j]=1.
+			kept.append(j)
+	if not kept: #a zero operator keeps one bond
+		kept=[0]
+	return kept,T[:len(kept)]
 
 def op2mpo(op,d,L): #opstring to mpo,opsting is an array
-	o=deepcopy(op)
-	D=d**2
+	o=np.asarray(op.todense() if hasattr(op,'todense') else op)
 
 	a=1;Ws=[]
 	for i in range(L):
 		O=o.reshape((a,d,d**(L-i-1),d,d**(L-i-1)))
-		O.transpose((0,1,3,2,4)).reshape(-1,d**(2*(L-i-1)))
+		O=O.transpose((0,1,3,2,4)).reshape(a*d*d,-1)
 		#blockize? seems not
 		U,S,Vdag=np.linalg.svd(O,full_matrices=False)
-		W=U.reshape(-1,d,d,U.shape[-1]) #blockize seem no need since add and compress
+		n=max(1,np.count_nonzero(S>1e-14*S[0]))
+		W=U[:,:n].reshape(a,d,d,n) #blockize seem no need since add and compress
 		Ws.append(W)
-		o=np.tensordot(np.diag(S),Vdag,1)
-		a=S.shape[0]
-	Ws[-1]*=float(o)
+		o=np.tensordot(np.diag(S[:n]),Vdag[:n],1)
+		a=n
+	Ws[-1]=Ws[-1]*o[0,0]
 	return MPO(d,L,Ws)
 
 def add(mpo1,mpo2):
+	'''sum of two mpos,the bond dimensions add(block diagonal W)'''
+	if mpo1.L==1:
+		return MPO(mpo1.d,1,[mpo1.Ws[0]+mpo2.Ws[0]])
+	Ws=[]
+	for l,(W1,W2) in enumerate(zip(mpo1.Ws,mpo2.Ws)):
+		if l==0:
+			W=np.concatenate([W1,W2],axis=3)
+		elif l==mpo1.L-1:
+			W=np.concatenate([W1,W2],axis=0)
+		else:
+			W=np.zeros((W1.shape[0]+W2.shape[0],)+W1.shape[1:3]+(W1.shape[3]+W2.shape[3],),dtype=np.result_type(W1,W2))
+			W[:W1.shape[0],:,:,:W1.shape[3]]=W1
+			W[W1.shape[0]:,:,:,W1.shape[3]:]=W2
+		Ws.append(W)
+	return MPO(mpo1.d,mpo1.L,Ws)
+
+def scale(mpo,c):
+	'''c times the mpo,the factor goes to the first W'''
+	return MPO(mpo.d,mpo.L,[mpo.Ws[0]*c]+mpo.Ws[1:])
+
+def prod(mpo1,mpo2):
+	'''operator product mpo1.mpo2,the bond dimensions multiply'''
 	Ws=[]
-	for l in range(mpo1.L):
-		for i in range(mpo1.d):
-			for j in range(mpo1.d):
-				if l==0:
-					W[:,i,j,:]=np.hstack(mpo1.Ws[l][:,i,j,:],mpo2.Ws[l][:,i,j,:])
-				elif l==mpo1.L-1:
-					W[:,i,j,:]=np.vstack(mpo1.Ws[l][:,i,j,:],mpo2.Ws[l][:,i,j,:])
-				else:
-					W[:,i,j,:]=block_diag(mpo1.Ws[l][:,i,j,:],mpo2.Ws[l][:,i,j,:])
-				Ws.append(W)
-	mpo=MPO(mpo1.d,mpo1.L,Ws)
-	return mpo
-'''
+	for W1,W2 in zip(mpo1.Ws,mpo2.Ws):
+		W=np.tensordot(W1,W2,axes=(2,1)) #w1,s,w1',w2,s'',w2'
+		W=W.transpose(0,3,1,4,2,5)
+		Ws.append(W.reshape((W1.shape[0]*W2.shape[0],)+W.shape[2:4]+(W1.shape[3]*W2.shape[3],)))
+	return MPO(mpo1.d,mpo1.L,Ws)
+
+def zipup(Ws,Ms,m,tol=0.):
+	'''
+	W.M from the left with an svd on every site(zip-up),M right canonical.returns left canonical tensors,
+	the last one carries the norm
+	'''
+	C=np.ones((1,1,1)) #new bond,mpo bond,old bond
+	As=[]
+	for i,(W,M) in enumerate(zip(Ws,Ms)):
+		T=np.tensordot(np.tensordot(C,M,axes=(2,0)),W,axes=([1,2],[0,2])) #k,b,s,w'
+		k,b,d,w=T.shape
+		T=T.transpose(0,2,3,1).reshape(k*d,w*b)
+		if i==len(Ms)-1:
+			As.append(T.reshape(k,d,1))
+			break
+		U,S,Vdag,err=svd_truncate(T,m,cut=tol,normalize=False)
+		As.append(U.reshape(k,d,-1))
+		C=(S[:,np.newaxis]*Vdag).reshape(-1,w,b)
+	return As
+
+def fit(Ws,Ms,Phis,m,tol=0.,nsweeps=2):
+	'''
+	variational fit of W.M by two-site updates of the right canonical guess Phis,the environments
+	<Phi|W|M> are cached and updated like in VMPSEngine
+	'''
+	L=len(Ms)
+	Ls=[np.ones((1,1,1))]+[None]*L
+	Rs=[None]*L+[np.ones((1,1,1))]
+	for i in range(L-1,0,-1):
+		Rs[i]=rupdate(Rs[i+1],Phis[i],Ws[i],Ms[i])
+	def theta(i):
+		x=np.tensordot(Ls[i],Ms[i],axes=(2,0)) #a,w,s1',m
+		x=np.tensordot(x,Ws[i],axes=([1,2],[0,2])) #a,m,s1,w1
+		x=np.tensordot(x,Ms[i+1],axes=(1,0)) #a,s1,w1,s2',c
+		x=np.tensordot(x,Ws[i+1],axes=([2,3],[0,2])) #a,s1,c,s2,w2
+		return np.tensordot(x,Rs[i+2],axes=([2,4],[2,1])) #a,s1,s2,b
+	for sweep in range(nsweeps):
+		for i in range(L-1):
+			x=theta(i)
+			a,d1,d2,b=x.shape
+			U,S,Vdag,err=svd_truncate(x.reshape(a*d1,d2*b),m,cut=tol,normalize=False)
+			Phis[i]=U.reshape(a,d1,-1)
+			Phis[i+1]=(S[:,np.newaxis]*Vdag).reshape(-1,d2,b)
+			Ls[i+1]=lupdate(Ls[i],Phis[i],Ws[i],Ms[i])
+		for i in range(L-2,-1,-1):
+			x=theta(i)
+			a,d1,d2,b=x.shape
+			U,S,Vdag,err=svd_truncate(x.reshape(a*d1,d2*b),m,cut=tol,normalize=False)
+			Phis[i]=(U*S).reshape(a,d1,-1)
+			Phis[i+1]=Vdag.reshape(-1,d2,b)
+			Rs[i+1]=rupdate(Rs[i+2],Phis[i+1],Ws[i+1],Ms[i+1])
+	return Phis
+
+def apply(mpo,mps,max_m,tol=0.,method='zipup',nsweeps=2):
+	'''
+	mpo.mps at bond dimension max_m,O(L m^3 D d)
+	method:'zipup' or 'variational'(two-site fit started from the zip-up result,nsweeps sweeps)
+	tol:maximum relative discarded weight of every bond
+	returns a right canonical mps whose first tensor carries the norm
+	'''
+	if not hasattr(mps,'Ms'):
+		mps=deepcopy(mps)
+		mps.contract_s() #contract S to A or B
+	Ms=right_canonical(mps.Ms)
+	As=zipup(mpo.Ws,Ms,2*max_m,tol/10.) #looser truncation on the way,the final one comes in the sweep back
+	for i in range(len(As)-1,0,-1):
+		a,d,b=As[i].shape
+		U,S,Vdag,err=svd_truncate(As[i].reshape(a,d*b),max_m,cut=tol,normalize=False)
+		As[i]=Vdag.reshape(-1,d,b)
+		As[i-1]=np.tensordot(As[i-1],U*S,axes=(2,0))
+	if method=='variational':
+		As=fit(mpo.Ws,Ms,As,max_m,tol,nsweeps)
+	elif method!='zipup':
+		raise ValueError('unknown method %s'%method)
+	rmps=MPS(mps.d,mps.L) #result mps
+	rmps.Ms=As
+	return rmps
+
 def act(mpo,mps):
+	'''exact mpo.mps,the bond dimensions multiply,the result is not canonical'''
+	if not hasattr(mps,'Ms'):
+		mps=deepcopy(mps)
+		mps.contract_s() #contract S to A or B
 	Ns=[]
-	tmps=deepcopy(mps) #target mps
-	tmps.contract_s() #contract S to A or B
-	for i in range(mpo.L):
-		N=contract(mpo.Ws[i],tmps.Ms[i],axes=([2,],[1,])) #details later
-		N.transpose((0,3,1,2)).reshape(N.shape[0]*N.shape[1],mpo.d,-1)
-		Ns.append(N)
-		rmps.Ms=Ns #result mps
+	for W,M in zip(mpo.Ws,mps.Ms):
+		N=np.tensordot(W,M,axes=(2,1)) #w,s,w',a,b
+		N=N.transpose(0,3,1,2,4)
+		Ns.append(N.reshape(W.shape[0]*M.shape[0],W.shape[1],-1))
+	rmps=MPS(mps.d,mps.L) #result mps
+	rmps.Ms=Ns
 	return rmps
-'''
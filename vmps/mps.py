@@ -95,6 +95,13 @@ def ket2mps(ket,d,L,cano='right',div=None): #dimension of state should be d^L
 	mps.Bs.reverse()
 	mps.S=np.diag(S) #blockize
 	return mps
+
+def overlap(bra,ket):
+	'''<bra|ket> of two mps with site tensors Ms'''
+	E=np.ones((1,1))
+	for B,M in zip(bra.Ms,ket.Ms):
+		E=np.tensordot(B.conjugate(),np.tensordot(E,M,axes=(1,0)),axes=([0,1],[0,1])) #b,b'
+	return E[0,0]
 '''
 def overlap(mps1,mps2,):	
 	overlap=np.array([[1.]])
@@ -1,7 +1,16 @@
 import numpy as np
-from scipy.sparse import kron
+from copy import copy
+from scipy.sparse import kron,identity
 from mpo import MPO,op2mpo,add
 
+'''
+operator strings and their mpo
+
+the mpo of a sum of op strings is built by a finite state machine:on the bond between site i-1 and i the
+state 0 means no operator applied yet,1 means a string completed and every string that started left of
+the bond and ends right of it has a state of its own,so the bond dimension is 2+number of open strings.
+'''
+
 class OpUnit(object):
 	def __init__(self,mat,site=None):
 		self.mat=mat
@@ -9,31 +18,86 @@ class OpUnit(object):
 		self.site=site
 
 class OpString(object):
+	'''
+	product of single site operators times param
+	construct:OpString(ops,L,param=1.)
+	'''
 	def __init__(self,ops,L,param=1.):
 		self.ops=ops
 		self.L=L
 		self.d=self.ops[0].d
 		self.param=param
-		
-		self.mat=np.array([[1.]])
-		for i in range(L):
-			siteop=False
-			for op in self.ops:
-				if op.site==i:
-					self.mat=kron(self.mat,op.mat)
-					siteop=True
-			if siteop==False:
-				self.mat=kron(self.mat,identity(self.d)
-		self.mat*=self.param
-	
+
+	def siteops(self):
+		'''[(site,matrix)] sorted by site,operators on the same site are multiplied in their order'''
+		mats={}
+		for op in self.ops:
+			mats[op.site]=mats[op.site].dot(op.mat) if op.site in mats else np.asarray(op.mat)
+		return sorted(mats.items())
+
+	@property
+	def mat(self):
+		'''the full d^L x d^L matrix,only for small chains'''
+		mats=dict(self.siteops())
+		mat=identity(1,format='csr')
+		for i in range(self.L):
+			mat=kron(mat,mats[i] if i in mats else identity(self.d),format='csr')
+		return mat*self.param
+
 	def tompo(self):
-		self.mpo=op2mpo(self.mat)
-		
+		self.mpo=fsm_mpo([self],self.L,self.d)
+		return self.mpo
+
+def fsm_mpo(opstrs,L,d):
+	'''mpo of the sum of the op strings,O(L*len(opstrs))'''
+	siteops=[dict(opstr.siteops()) for opstr in opstrs]
+	spans=[(min(ops),max(ops)) for ops in siteops]
+	states=[{} for i in range(L+1)] #{string index:state} on the bond left of site i
+	for k,(first,last) in enumerate(spans):
+		for i in range(first+1,last+1):
+			states[i][k]=2+len(states[i])
+	dtype=np.result_type(float,*([opstr.param for opstr in opstrs]+[mat for ops in siteops for mat in ops.values()]))
+	I=np.identity(d)
+	Ws=[]
+	for i in range(L):
+		W=np.zeros((2+len(states[i]),d,d,2+len(states[i+1])),dtype=dtype)
+		W[0,:,:,0]=I
+		W[1,:,:,1]=I
+		for k,(first,last) in enumerate(spans):
+			if i<first or i>last:
+				continue
+			mat=siteops[k].get(i,I)
+			l=0 if i==first else states[i][k]
+			r=1 if i==last else states[i+1][k]
+			W[l,:,:,r]+=mat*opstrs[k].param if i==first else mat
+		Ws.append(W)
+	Ws[0]=Ws[0][:1]
+	Ws[-1]=Ws[-1][:,:,:,1:2]
+	return MPO(d,L,Ws)
+
 class OpCollection(object):
-	def __init__(self,opstrs):
+	'''
+	sum of op strings
+	construct:OpCollection(opstrs,compress=False,tol=1e-12)
+	compress:svd compression of the state machine mpo,keeps the singular values above tol(relative),which is
+	exact for sums of local terms and shrinks the bond dimension of long range terms
+	collections are added with +,the sum of the mpos is compressed,so the bond dimension stays bounded when
+	terms are added one by one
+	'''
+	def __init__(self,opstrs,compress=False,tol=1e-12):
 		self.opstrs=opstrs
-		self.mpo=self.opstrs[0].mpo
-		for i in range(1,len(self.opstrs)):
-			self.mpo=add(self.mpo,self.opstrs[i].mpo)
-		
+		self.L=self.opstrs[0].L
+		self.d=self.opstrs[0].d
+		self.tol=tol
+		self.mpo=fsm_mpo(self.opstrs,self.L,self.d)
+		if compress:
+			self.mpo.compress(tol=tol)
 
+	def __add__(self,other):
+		'''sum with an OpCollection or an OpString'''
+		if isinstance(other,OpString):
+			other=OpCollection([other])
+		res=copy(self)
+		res.opstrs=self.opstrs+other.opstrs
+		res.mpo=add(self.mpo,other.mpo).compress(tol=self.tol)
+		return res
@@ -0,0 +1,152 @@
+import numpy as np
+
+from marker import Marker,blockize
+from tensor import Tensor,from_array,tensordot,svd,zeros,tovec,fromvec
+from mps import MPS
+from vmps import VMPSEngine,lupdate,rupdate,lowest
+
+'''
+two-site variational mps with U(1) quantum numbers on block-sparse Tensors
+
+the site tensors M[a,s,b] have the signs (+,+,-) and Q=0,so the charge of the bond b is the charge of a plus
+the one of s,the total charge of the state is the charge of the last bond.the mpo tensors W[w,s,s',w'] have
+the signs (+,+,-,-),the charge of w' is the charge of w plus the one the operator adds.
+the environments are built by lupdate and rupdate of vmps.py,only blocks allowed by the charges are stored
+and contracted.the two-site wavefunction is kept as a matrix[(a,s1),(s2,b)],L.W1 and W2.R are contracted once
+per step with the same legs merged,so a matvec is two contractions of few large blocks.
+'''
+
+def tensor_mpo(mpo,site,tol=1e-14):
+	'''
+	the mpo as block-sparse Tensors,site:compact Marker of the physical index(sign +1)
+	the charge of every mpo bond index is read from its nonzero entries,the indices are sorted by charge
+	'''
+	qs=np.array([q for q,n in zip(site.qns,site.sizes) for i in range(n)])
+	left=Marker([0],[1],sign=1)
+	Ws=[]
+	perm=[0]
+	for l,W in enumerate(mpo.Ws):
+		W=W[perm]
+		wqns=[]
+		for k in range(W.shape[-1]):
+			nz=np.argwhere(abs(W[...,k])>tol)
+			wqns.append(0 if len(nz)==0 else left.qns[np.searchsorted(np.cumsum(left.sizes),nz[0][0],side='right')]+qs[nz[0][1]]-qs[nz[0][2]])
+		right,perm=blockize(wqns,sign=-1)
+		W=W[...,perm]
+		t=from_array(W,[left,site,site.flip(),right])
+		if abs(t.toarray()-W).max()>tol:
+			raise ValueError('the mpo does not conserve the charges of the site marker')
+		Ws.append(t)
+		left=right.flip()
+	return Ws
+
+def product_mps(states,site):
+	'''block-sparse site tensors of the product state of the site states(indices),bond dimension 1'''
+	qs=[q for q,n in zip(site.qns,site.sizes) for i in range(n)]
+	Ms=[]
+	q=0
+	for s in states:
+		M=np.zeros((1,site.dim,1))
+		M[0,s,0]=1.
+		Ms.append(from_array(M,[Marker([q],[1],sign=1),site,Marker([q+qs[s]],[1],sign=-1)]))
+		q+=qs[s]
+	return Ms
+
+def lw_env(L,W):
+	'''L.W as a Tensor[(a,s),w',(a',s')]'''
+	return tensordot(L,W,axes=(1,0)).transpose(0,2,4,1,3).merge(0,1).merge(2,3) #a,s,w',a',s'
+
+def wr_env(W,R):
+	'''W.R as a Tensor[(s,b),w,(s',b')]'''
+	return tensordot(W,R,axes=(3,1)).transpose(1,3,0,2,4).merge(0,1).merge(2,3) #s,b,w,s',b'
+
+def heff2_qn(LW,WR,theta):
+	'''two-site effective hamiltonian applied to theta[(a',s1'),(s2',b')]'''
+	return tensordot(tensordot(LW,theta,axes=(2,0)),WR,axes=([1,2],[1,2]))
+
+def lowest_qn(apply,theta,tol=0.):
+	'''lowest eigenpair of a hermitian operator on the Tensors with the markers and charge of theta'''
+	template=zeros(theta.markers,theta.Q,theta.dtype)
+	E,v=lowest(lambda x:tovec(apply(fromvec(x,template)),template),tovec(theta,template),tol)
+	t=fromvec(v,template)
+	t.blocks=dict((qns,block) for qns,block in t.blocks.items() if np.any(block))
+	return E,t
+
+def split_theta(theta,m,cut=1e-16):
+	'''
+	blockwise svd of theta[(a,s1),(s2,b)] keeping m states,a relative discarded weight up to cut is dropped
+	returns U[a,s1,c],the normalized singular values {charge of c:S},V[c,s2,b] and the discarded weight
+	'''
+	U,S,V=svd(theta,m,cut)
+	norm=np.sqrt(sum(np.sum(s**2) for s in S.values()))
+	S=dict((q,s/norm) for q,s in S.items())
+	return U.split(0),S,V.split(1),U.discarded
+
+def scale_rows(S,V):
+	'''S.V,S the singular values of the first index of V'''
+	return Tensor(V.markers,dict((qns,S[qns[0]].reshape((-1,)+(1,)*(block.ndim-1))*block) for qns,block in V.blocks.items()),V.Q)
+
+def scale_cols(U,S):
+	'''U.S,S the singular values of the last index of U'''
+	return Tensor(U.markers,dict((qns,block*S[qns[-1]]) for qns,block in U.blocks.items()),U.Q)
+
+class QNVMPSEngine(VMPSEngine):
+	'''
+	two-site variational mps engine on block-sparse Tensors,starts from a product state
+	construct:QNVMPSEngine(Hmpo,states,site)
+
+	Hmpo:hamiltonian MPO(dense W) conserving the charges,states:indices of the site states of the start state,
+	which fixes the charge sector,site:compact Marker of the physical index
+	'''
+	def __init__(self,Hmpo,states,site):
+		self.L=Hmpo.L
+		self.d=Hmpo.d
+		self.site=site
+		self.Ws=tensor_mpo(Hmpo,site)
+		self.Ms=product_mps(states,site)
+		self.mps=MPS(self.d,self.L)
+		self.Ls=[None]*(self.L+1)
+		self.Rs=[None]*(self.L+1)
+		self.energys=[]
+		self.errs=[]
+
+	def contract(self): #the product state is right canonical,calculate Rs
+		Q=self.Ms[-1].markers[2].qns[0]
+		self.Ls[0]=Tensor([Marker([0],[1],sign=1),Marker([0],[1],sign=-1),Marker([0],[1],sign=-1)],{(0,0,0):np.ones((1,1,1))})
+		self.Rs[self.L]=Tensor([Marker([Q],[1],sign=-1),Marker([0],[1],sign=1),Marker([Q],[1],sign=1)],{(Q,0,Q):np.ones((1,1,1))})
+		for i in range(self.L-1,0,-1):
+			self.Rs[i]=rupdate(self.Rs[i+1],self.Ms[i],self.Ws[i])
+
+	def solve(self,i,tol=0.):
+		'''lowest state of the sites i,i+1 as a matrix[(a,s1),(s2,b)]'''
+		theta=tensordot(self.Ms[i],self.Ms[i+1],axes=(2,0)).merge(0,1).merge(1,2)
+		LW,WR=lw_env(self.Ls[i],self.Ws[i]),wr_env(self.Ws[i+1],self.Rs[i+2])
+		return lowest_qn(lambda x:heff2_qn(LW,WR,x),theta,tol)
+
+	def right_sweep(self,m,nsite=2,alpha=0.,tol=0.):
+		'''sweep the orthogonality center from site 0 to site L-1'''
+		assert(nsite==2)
+		Ws=self.Ws
+		for i in range(self.L-1):
+			E,theta=self.solve(i,tol)
+			U,S,V,err=split_theta(theta,m)
+			self.Ms[i]=U
+			self.Ms[i+1]=scale_rows(S,V)
+			self.Ls[i+1]=lupdate(self.Ls[i],self.Ms[i],Ws[i])
+			self.energys.append(E);self.errs.append(err)
+
+	def left_sweep(self,m,nsite=2,alpha=0.,tol=0.):
+		'''sweep the orthogonality center from site L-1 to site 0'''
+		assert(nsite==2)
+		Ws=self.Ws
+		for i in range(self.L-2,-1,-1):
+			E,theta=self.solve(i,tol)
+			U,S,V,err=split_theta(theta,m)
+			self.Ms[i]=scale_cols(U,S)
+			self.Ms[i+1]=V
+			self.Rs[i+1]=rupdate(self.Rs[i+2],self.Ms[i+1],Ws[i+1])
+			self.energys.append(E);self.errs.append(err)
+
+	def dense(self):
+		'''the site tensors as dense arrays'''
+		return [M.toarray() for M in self.Ms]
@@ -0,0 +1,173 @@
+import numpy as np
+from scipy.linalg import expm
+
+from vmps import VMPSEngine,lupdate,rupdate,heff1,heff2,svd_truncate
+
+'''
+time dependent variational principle(tdvp) on the environments of VMPSEngine
+
+a step of exp(-dt H) is a right sweep and a left sweep of dt/2 each(second order,no trotter error).a real dt
+evolves in imaginary time,dt=1j*t in real time.every site(one-site) or bond(two-site) is evolved forward
+by the effective hamiltonian and the center matrix(one-site) or the next site(two-site) backward,all
+exponentials come from krylov bases of the matrix free effective hamiltonians,O(m^3) per site.
+'''
+
+def bond_apply(L,R,C):
+	'''zero-site effective hamiltonian applied to the center matrix C[a',b']'''
+	return np.tensordot(np.tensordot(L,C,axes=(2,0)),R,axes=([1,2],[1,2])) #a,b
+
+class Krylov(object):
+	'''
+	lanczos basis of a hermitian operator started from v,for exp(-dt H)v
+	construct:Krylov(apply,v,dt,tol=1e-12,maxiter=40)
+
+	the basis is extended until exp(-dt H)v is converged to tol.the evolved state is kept as coefficients in the
+	basis,so advance() evolves it further with the same operator without new matvecs.
+	'''
+	def __init__(self,apply,v,dt,tol=1e-12,maxiter=40):
+		self.shape=v.shape
+		beta=np.linalg.norm(v)
+		V=[np.ravel(v)/beta]
+		alphas,betas=[],[]
+		for j in range(maxiter):
+			w=np.ravel(apply(V[j].reshape(self.shape)))
+			alphas.append(np.vdot(V[j],w).real)
+			for u in V: #full reorthogonalization
+				w=w-np.vdot(u,w)*u
+			b=np.linalg.norm(w)
+			T=np.diag(alphas)+np.diag(betas,1)+np.diag(betas,-1)
+			if b<1e-14 or b*abs(expm(-dt*T)[-1,0])<tol: #invariant subspace or converged
+				break
+			betas.append(b)
+			V.append(w/b)
+		self.V=np.array(V[:len(alphas)])
+		self.T=T
+		self.c=np.zeros(len(alphas),dtype=np.result_type(dt,V[0]))
+		self.c[0]=beta
+
+	def advance(self,dt):
+		'''evolve the state by exp(-dt H) and return it'''
+		self.c=expm(-dt*self.T).dot(self.c)
+		return self.V.T.dot(self.c).reshape(self.shape)
+
+class TDVPEngine(VMPSEngine):
+	'''
+	one-site and two-site tdvp,the orthogonality center is at site 0 between two steps
+	construct:TDVPEngine(Hmpo,gmps)
+
+	attributes:
+	t:evolved time
+	krylov:(site key,Krylov) of the last forward update.at the turning points of the sweeps the same site is
+	evolved forward twice in a row,the second half step continues in the basis of the first one
+	'''
+	def __init__(self,Hmpo,gmps,tol=1e-12,maxiter=40):
+		VMPSEngine.__init__(self,Hmpo,gmps)
+		self.tol=tol
+		self.maxiter=maxiter
+		self.krylov=None
+		self.t=0.
+
+	def forward(self,key,apply,x,dt):
+		'''exp(-dt H)x,continued in the krylov basis of the last forward update if it was the same key'''
+		if self.krylov is not None and self.krylov[0]==key:
+			K=self.krylov[1]
+		else:
+			K=Krylov(apply,x,2*dt,self.tol,self.maxiter) #converged for both half steps of a turning point
+		self.krylov=(key,K)
+		x=K.advance(dt)
+		return x/np.linalg.norm(x) if np.real(dt)!=0 else x
+
+	def backward(self,apply,x,dt):
+		'''exp(+dt H)x of the backward evolution'''
+		return Krylov(apply,x,-dt,self.tol,self.maxiter).advance(-dt)
+
+	def right_sweep1(self,dt):
+		Ws=self.Hmpo.Ws
+		for i in range(self.L):
+			L,W,R=self.Ls[i],Ws[i],self.Rs[i+1]
+			M=self.forward((1,i,dt),lambda x:heff1(L,W,R,x),self.Ms[i],dt)
+			if i==self.L-1:
+				self.Ms[i]=M
+				break
+			a,d,b=M.shape
+			Q,C=np.linalg.qr(M.reshape(a*d,b))
+			self.Ms[i]=Q.reshape(a,d,-1)
+			self.Ls[i+1]=lupdate(L,self.Ms[i],W)
+			C=self.backward(lambda x:bond_apply(self.Ls[i+1],R,x),C,dt)
+			self.Ms[i+1]=np.tensordot(C,self.Ms[i+1],axes=(1,0))
+
+	def left_sweep1(self,dt):
+		Ws=self.Hmpo.Ws
+		for i in range(self.L-1,-1,-1):
+			L,W,R=self.Ls[i],Ws[i],self.Rs[i+1]
+			M=self.forward((1,i,dt),lambda x:heff1(L,W,R,x),self.Ms[i],dt)
+			if i==0:
+				self.Ms[i]=M
+				break
+			a,d,b=M.shape
+			Q,C=np.linalg.qr(M.reshape(a,d*b).T)
+			self.Ms[i]=Q.T.reshape(-1,d,b)
+			self.Rs[i]=rupdate(R,self.Ms[i],W)
+			C=self.backward(lambda x:bond_apply(L,self.Rs[i],x),C.T,dt)
+			self.Ms[i-1]=np.tensordot(self.Ms[i-1],C,axes=(2,0))
+
+	def right_sweep2(self,dt,m):
+		Ws=self.Hmpo.Ws
+		for i in range(self.L-1):
+			L,R=self.Ls[i],self.Rs[i+2]
+			theta=np.tensordot(self.Ms[i],self.Ms[i+1],axes=(2,0))
+			theta=self.forward((2,i,dt),lambda x:heff2(L,Ws[i],Ws[i+1],R,x),theta,dt)
+			a,d1,d2,b=theta.shape
+			U,S,Vdag,err=svd_truncate(theta.reshape(a*d1,d2*b),m)
+			self.errs.append(err)
+			self.Ms[i]=U.reshape(a,d1,-1)
+			self.Ms[i+1]=(S[:,np.newaxis]*Vdag).reshape(-1,d2,b)
+			self.Ls[i+1]=lupdate(L,self.Ms[i],Ws[i])
+			if i<self.L-2:
+				self.Ms[i+1]=self.backward(lambda x:heff1(self.Ls[i+1],Ws[i+1],self.Rs[i+2],x),self.Ms[i+1],dt)
+
+	def left_sweep2(self,dt,m):
+		Ws=self.Hmpo.Ws
+		for i in range(self.L-2,-1,-1):
+			L,R=self.Ls[i],self.Rs[i+2]
+			theta=np.tensordot(self.Ms[i],self.Ms[i+1],axes=(2,0))
+			theta=self.forward((2,i,dt),lambda x:heff2(L,Ws[i],Ws[i+1],R,x),theta,dt)
+			a,d1,d2,b=theta.shape
+			U,S,Vdag,err=svd_truncate(theta.reshape(a*d1,d2*b),m)
+			self.errs.append(err)
+			self.Ms[i]=(U*S).reshape(a,d1,-1)
+			self.Ms[i+1]=Vdag.reshape(-1,d2,b)
+			self.Rs[i+1]=rupdate(R,self.Ms[i+1],Ws[i+1])
+			if i>0:
+				self.Ms[i]=self.backward(lambda x:heff1(L,Ws[i],self.Rs[i+1],x),self.Ms[i],dt)
+
+	def evolve(self,dt,nsteps=1,nsite=1,m=None):
+		'''
+		nsteps tdvp steps of exp(-dt H)
+		nsite:1 keeps the bond dimensions,2 lets them grow up to m
+		'''
+		if self.Rs[1] is None:
+			self.contract()
+		self.krylov=None
+		dtype=np.result_type(dt,*self.Ms)
+		self.Ms=[M.astype(dtype) for M in self.Ms]
+		for step in range(nsteps):
+			if nsite==1:
+				self.right_sweep1(dt/2.)
+				self.left_sweep1(dt/2.)
+			else:
+				self.right_sweep2(dt/2.,m)
+				self.left_sweep2(dt/2.,m)
+			self.t+=dt
+		self.mps.Ms=self.Ms
+
+	def energy(self):
+		'''energy of the current state,the orthogonality center is at site 0'''
+		M=self.Ms[0]
+		return np.vdot(M,heff1(self.Ls[0],self.Hmpo.Ws[0],self.Rs[1],M)).real/np.vdot(M,M).real
+
+	def toket(self):
+		ket=np.ones((1,1))
+		for M in self.Ms:
+			ket=np.tensordot(ket,M,1)
+		return ket.ravel()
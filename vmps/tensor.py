@@ -1,72 +1,229 @@
 import numpy as np
 
-from marker import bcadd
+from marker import Marker,blockize,fuse
 
-class Tensor():
-	def __init__(self,array,markers=None):
-		self.array=array
-		self.shape=self.array.shape
-		self.markers=markers #a list of markers for each axes
-		self.dim=len(self.shape)		
+'''
+block-sparse tensor with U(1) quantum numbers
 
-	def reshape(self,shape,markers=None): #split axes
-		self.shape=shape
-		self.array.reshape(shape)
-		self.markers=markers
+only the dense blocks allowed by the symmetry are stored,keyed by the tuple of block charges
+of all axes.a block (q0,q1,...) is allowed if sum(marker.sign*q)==Q.
+'''
+
+class Tensor(object):
+	def __init__(self,markers,blocks=None,Q=0):
+		self.markers=list(markers) #a list of compact markers for each axes
+		self.blocks=blocks if blocks is not None else {}
+		self.Q=Q
+		self.dim=len(self.markers)
+		self.shape=tuple(mk.dim for mk in self.markers)
+
+	def allowed(self,qns):
+		return abs(sum(mk.sign*q for mk,q in zip(self.markers,qns))-self.Q)<1e-8
+
+	def toarray(self):
+		array=np.zeros(self.shape,dtype=self.dtype)
+		for qns,block in self.blocks.items():
+			slices=[]
+			for mk,q in zip(self.markers,qns):
+				i=mk.index(q)
+				slices.append(slice(mk.offsets()[i],mk.offsets()[i]+mk.sizes[i]))
+			array[tuple(slices)]=block
+		return array
+
+	@property
+	def dtype(self):
+		if self.blocks:
+			return np.result_type(*self.blocks.values())
+		return np.dtype('d')
+
+	def copy(self):
+		return Tensor(self.markers,dict((qns,block.copy()) for qns,block in self.blocks.items()),self.Q)
+
+	def conjugate(self): #conjugate tensor lives in the dual space,all signs flip
+		return Tensor([mk.flip() for mk in self.markers],dict((qns,block.conjugate()) for qns,block in self.blocks.items()),-self.Q)
+
+	def norm(self):
+		return np.sqrt(sum(np.vdot(block,block).real for block in self.blocks.values()))
+
+	def __mul__(self,c):
+		return Tensor(self.markers,dict((qns,block*c) for qns,block in self.blocks.items()),self.Q)
+
+	__rmul__=__mul__
+
+	def __add__(self,other):
+		blocks=dict((qns,block.copy()) for qns,block in self.blocks.items())
+		for qns,block in other.blocks.items():
+			if qns in blocks:
+				blocks[qns]=blocks[qns]+block
+			else:
+				blocks[qns]=block.copy()
+		return Tensor(self.markers,blocks,self.Q)
+
+	def __sub__(self,other):
+		return self+other*(-1.)
+
+	def transpose(self,*order): #transpose([2,0,1]) or transpose(2,0,1) like numpy
+		if len(order)==1:
+			order=order[0]
+		markers=[self.markers[i] for i in order]
+		blocks=dict((tuple(qns[i] for i in order),block.transpose(order)) for qns,block in self.blocks.items())
+		return Tensor(markers,blocks,self.Q)
 
 	def merge(self,axe1,axe2): #can only merge neighbor axes
-		self.markers[axe1]=bcadd(self.markers[axe1],self.markers[axe2])
-		del(self.markers[axe2])
-		self.shape[axe1]+=self.shape[axe2]
-		del(self.shape[axe2])
-		self.array.reshape(self.shape)
-		
-	'''
-	def split(self,axe,shape,markers):	#can only split to neighbor axes	
-		nshape=()
-		nmarkers=[]
-		for i in range(self.rank):
-			if self.shape[i]!=axe:	
-				nshape.append(self.shape[i])
-				nmarkers.append(self.markers[i])				
+		assert(axe2==axe1+1)
+		mk=fuse(self.markers[axe1],self.markers[axe2])
+		markers=self.markers[:axe1]+[mk]+self.markers[axe2+1:]
+		offsets={}
+		for q,parts in mk.parts.items():
+			for q1,q2,offset in parts:
+				offsets[(q1,q2)]=(q,offset)
+		blocks={}
+		for qns,block in self.blocks.items():
+			q,offset=offsets[(qns[axe1],qns[axe2])]
+			nqns=qns[:axe1]+(q,)+qns[axe2+1:]
+			if nqns not in blocks:
+				shape=[markers[i].size(nqns[i]) for i in range(len(nqns))]
+				blocks[nqns]=np.zeros(shape,dtype=block.dtype)
+			shape=block.shape[:axe1]+(block.shape[axe1]*block.shape[axe2],)+block.shape[axe2+1:]
+			index=[slice(None)]*len(nqns);index[axe1]=slice(offset,offset+shape[axe1])
+			blocks[nqns][tuple(index)]=block.reshape(shape)
+		return Tensor(markers,blocks,self.Q)
+
+	def split(self,axe): #inverse of merge
+		mk=self.markers[axe]
+		mk1,mk2=mk.sub
+		markers=self.markers[:axe]+[mk1,mk2]+self.markers[axe+1:]
+		blocks={}
+		for qns,block in self.blocks.items():
+			for q1,q2,offset in mk.parts[qns[axe]]:
+				n1,n2=mk1.size(q1),mk2.size(q2)
+				index=[slice(None)]*block.ndim;index[axe]=slice(offset,offset+n1*n2)
+				sub=block[tuple(index)]
+				nqns=qns[:axe]+(q1,q2)+qns[axe+1:]
+				blocks[nqns]=sub.reshape(block.shape[:axe]+(n1,n2)+block.shape[axe+1:])
+		return Tensor(markers,blocks,self.Q)
+
+	def reshape(self,axes): #merge groups of neighbor axes,axes is a list like [[0,1],[2]]
+		t=self
+		for group in reversed(axes):
+			for i in range(len(group)-1):
+				t=t.merge(group[0],group[0]+1)
+		return t
+
+def from_array(array,markers,Q=0,tol=0.): #markers must be compact
+	t=Tensor(markers,Q=Q)
+	ranges=[[(q,slice(o,o+n)) for q,o,n in zip(mk.qns,mk.offsets(),mk.sizes)] for mk in markers]
+	for qs in _product(ranges):
+		qns=tuple(q for q,s in qs)
+		if t.allowed(qns):
+			block=array[tuple(s for q,s in qs)]
+			if block.size and np.abs(block).max()>tol:
+				t.blocks[qns]=np.array(block)
+	return t
+
+def zeros(markers,Q=0,dtype='d'): #all allowed blocks filled with zeros
+	t=Tensor(markers,Q=Q)
+	for qs in _product([zip(mk.qns,mk.sizes) for mk in markers]):
+		qns=tuple(q for q,n in qs)
+		if t.allowed(qns):
+			t.blocks[qns]=np.zeros([n for q,n in qs],dtype=dtype)
+	return t
+
+def tovec(t,template): #the blocks of t in the block order of template as one vector,missing blocks are zero
+	return np.concatenate([t.blocks[qns].ravel() if qns in t.blocks else np.zeros(block.size,dtype=t.dtype)
+		for qns,block in sorted(template.blocks.items())])
+
+def fromvec(v,template): #inverse of tovec
+	blocks={};start=0
+	for qns,block in sorted(template.blocks.items()):
+		blocks[qns]=v[start:start+block.size].reshape(block.shape)
+		start+=block.size
+	return Tensor(template.markers,blocks,template.Q)
+
+def _product(lists):
+	res=[[]]
+	for l in lists:
+		res=[r+[x] for r in res for x in l]
+	return res
+
+def tensordot(t1,t2,axes): #axes as in np.tensordot,a pair of axes or of lists of axes
+	axes1,axes2=[list(np.atleast_1d(ax)) for ax in axes]
+	for i,j in zip(axes1,axes2):
+		assert(t1.markers[i].sign==-t2.markers[j].sign)
+	free1=[i for i in range(t1.dim) if i not in axes1]
+	free2=[j for j in range(t2.dim) if j not in axes2]
+	markers=[t1.markers[i] for i in free1]+[t2.markers[j] for j in free2]
+	table={}
+	for qns2,block2 in t2.blocks.items():
+		table.setdefault(tuple(qns2[j] for j in axes2),[]).append((qns2,block2))
+	blocks={}
+	for qns1,block1 in t1.blocks.items():
+		for qns2,block2 in table.get(tuple(qns1[i] for i in axes1),[]):
+			qns=tuple(qns1[i] for i in free1)+tuple(qns2[j] for j in free2)
+			block=np.tensordot(block1,block2,axes=(axes1,axes2))
+			if qns in blocks:
+				blocks[qns]+=block
 			else:
-				nshape.extend(shape)
-				nmarkers.extend(markers)
-		self.shape=nshape
-		self.nmarkers=nmarkers	
-	'''
-
-	def transpose(self,order)	 
-		self.array.transpose(order)
-		markers=[]
-		for i in len(order):
-			markers.append(deepcopy(self.markers[order[i]]))
-		self.markers=markers
-		self.shape=self.array.shape
-
-	'''
-	def blockize(self): #only blockize a two dimensional matrix
-		perm0=self.markers[0].reorder
-		perm1=self.markers[1].reorder
-		a=np.array(self.shape)
-		for i in self.shape[0]:
-			for j in self.shape[1]:
-				a[i][j]=self.array[perm0[i]][perm1[j]]
-		self.array=a
-
-	def take(self,i): #take some subspace(block)
-		a=np.array(self.markers[0].sizes[i],self.markers[1].sizes[i])
-		a=self.array[self.markers[0].divs[i]:self.markers[0].divs[i]+self.makers[0].sizes[i]][...] #wrong
-		return a
-
-def tensordot(t1,t2,axes=None):
-	array=np.tensordot(t1.array,t2.array,axes)
-	markers=t1.markers.del()+t2.markers.del()
-	return Tensor(array,markers)
-
-def add(t1,t2):
-
-def svd(psi):
-	
-def solve(H): #solve eigen problem
-'''	
+				blocks[qns]=block
+	return Tensor(markers,blocks,t1.Q+t2.Q)
+
+def _select(svals,m=None,tol=0.):
+	'''choose the kept states from a dict of blockwise weights,returns {qn:number kept} and the discarded weight'''
+	qns=sorted(svals.keys())
+	if not qns:
+		return {},0.
+	allvals=np.concatenate([svals[q] for q in qns])
+	owner=np.concatenate([[i]*len(svals[q]) for i,q in enumerate(qns)]).astype(int)
+	order=np.argsort(-allvals,kind='mergesort')
+	total=allvals.sum()
+	kept=len(order) if m is None else min(m,len(order))
+	if tol>0. and total>0.:
+		discarded=np.cumsum(allvals[order][::-1])[::-1]/total #weight discarded if cut before position i
+		kept=min(kept,max(1,int(np.count_nonzero(discarded>tol))))
+	nkept=dict((q,0) for q in qns)
+	for i in order[:kept]:
+		nkept[qns[owner[i]]]+=1
+	return nkept,float(allvals[order[kept:]].sum())
+
+def svd(t,m=None,tol=0.): #blockwise svd of a matrix(2 axes tensor),truncated to m states globally
+	blocks={}
+	for (q0,q1),block in t.blocks.items():
+		blocks[q0]=np.linalg.svd(block,full_matrices=False)+(q1,)
+	nkept,discarded=_select(dict((q,b[1]**2) for q,b in blocks.items()),m,tol)
+	qns=[q for q in sorted(blocks.keys()) if nkept[q]>0]
+	bond=Marker(qns,[nkept[q] for q in qns],sign=-t.markers[0].sign)
+	U=Tensor([t.markers[0],bond],Q=0)
+	V=Tensor([bond.flip(),t.markers[1]],Q=t.Q)
+	S={}
+	for q in qns:
+		u,s,vdag,q1=blocks[q];n=nkept[q]
+		U.blocks[(q,q)]=u[:,:n]
+		S[q]=s[:n]
+		V.blocks[(q,q1)]=vdag[:n]
+	U.discarded=V.discarded=discarded
+	return U,S,V
+
+def qr(t): #blockwise qr of a matrix(2 axes tensor)
+	qns=sorted(q0 for q0,q1 in t.blocks.keys())
+	Qs={};Rs={}
+	for (q0,q1),block in t.blocks.items():
+		Qs[q0],Rs[(q0,q1)]=np.linalg.qr(block)
+	bond=Marker(qns,[Qs[q].shape[1] for q in qns],sign=-t.markers[0].sign)
+	Qt=Tensor([t.markers[0],bond],dict(((q,q),Qs[q]) for q in qns),Q=0)
+	Rt=Tensor([bond.flip(),t.markers[1]],dict(((q0,q1),r) for (q0,q1),r in Rs.items()),Q=t.Q)
+	return Qt,Rt
+
+def eigh(t,m=None,tol=0.): #blockwise eigh of a hermitian matrix with Q=0,keeps the m largest eigenvalues
+	assert(t.Q==0)
+	evals={};evecs={}
+	for (q0,q1),block in t.blocks.items():
+		evals[q0],evecs[q0]=np.linalg.eigh(block)
+		evals[q0]=evals[q0][::-1];evecs[q0]=evecs[q0][:,::-1]
+	if m is None and tol==0.:
+		nkept=dict((q,len(e)) for q,e in evals.items())
+	else:
+		nkept,discarded=_select(dict((q,np.maximum(e,0.)) for q,e in evals.items()),m,tol)
+	qns=[q for q in sorted(evals.keys()) if nkept[q]>0]
+	bond=Marker(qns,[nkept[q] for q in qns],sign=-t.markers[0].sign)
+	U=Tensor([t.markers[0],bond],dict(((q,q),evecs[q][:,:nkept[q]]) for q in qns),Q=0)
+	return dict((q,evals[q][:nkept[q]]) for q in qns),U
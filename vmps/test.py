@@ -1,30 +1,62 @@
+import time
 import numpy as np
-from scipy.sparse import kron,identity
-from scipy.sparse import kron
 
 from ops import OpUnit,OpString,OpCollection
+from mps import ket2mps
+from vmps import VMPSEngine
+from testvmps import heisenberg_mpo
 '''heisenberg model'''
 
-L=6
 J=1.
-sp=np.array([[0,1],[0,0]])
-sm=np.array([[0,0],[1,0]])
-sz=np.array([[1,0],[0,-1]])*0.5
-
-opstrs=[]
-for i in range(L-1):
-	opstr=OpString([OpUnit(sp,site=i),OpUnit(sm,site=i+1)])
-	opstr2=
-	opstr3=
-	opstrs.extend([opstr,opstr2,opstr3])
-
-opcol=OpCollenction(opstrs)	
-
-up=np.array([1.,0])
-dn=np.array([0,1.])
-
-state=up
-for i in range(L-1):
-	state=kron(state,up)
-	
-gmps=ket2mps(state)
+sp=np.array([[0,1.],[0,0]])
+sm=np.array([[0,0],[1.,0]])
+sz=np.array([[1.,0],[0,-1.]])*0.5
+
+def heisenberg_opstrs(L):
+	opstrs=[]
+	for i in range(L-1):
+		opstr=OpString([OpUnit(sp,site=i),OpUnit(sm,site=i+1)],L,param=J/2)
+		opstr2=OpString([OpUnit(sm,site=i),OpUnit(sp,site=i+1)],L,param=J/2)
+		opstr3=OpString([OpUnit(sz,site=i),OpUnit(sz,site=i+1)],L,param=J)
+		opstrs.extend([opstr,opstr2,opstr3])
+	return opstrs
+
+def mpo2mat(mpo):
+	mat=np.ones((1,1,1))
+	for W in mpo.Ws:
+		mat=np.tensordot(mat,W,1).transpose(0,2,1,3,4) #s,t,s',t',w'
+		mat=mat.reshape(mat.shape[0]*mat.shape[1],mat.shape[2]*mat.shape[3],-1)
+	return mat[:,:,0]
+
+def test_fsm(L=6):
+	opstrs=heisenberg_opstrs(L)
+	opstrs.append(OpString([OpUnit(sz,site=0),OpUnit(sp,site=2),OpUnit(sm,site=L-1)],L,param=0.3)) #a long string
+	opstrs.append(OpString([OpUnit(sz,site=1)],L,param=0.7))
+	opcol=OpCollection(opstrs)
+	print 'bond dimensions',[W.shape[-1] for W in opcol.mpo.Ws]
+	print 'diff',abs(mpo2mat(opcol.mpo)-sum(opstr.mat for opstr in opstrs)).max()
+
+def test_compress(L=8):
+	opstrs=[OpString([OpUnit(sz,site=i),OpUnit(sz,site=j)],L,param=1./(j-i)) for i in range(L) for j in range(i+1,L)]
+	opcol=OpCollection(opstrs)
+	mat=mpo2mat(opcol.mpo)
+	print 'all pairs:bond dimensions',[W.shape[-1] for W in opcol.mpo.Ws]
+	opcol.mpo.compress()
+	print 'compressed',[W.shape[-1] for W in opcol.mpo.Ws],'diff',abs(mpo2mat(opcol.mpo)-mat).max()
+	opcol=OpCollection(heisenberg_opstrs(L),compress=True)
+	print 'heisenberg compressed',[W.shape[-1] for W in opcol.mpo.Ws]
+
+def test_large(L=200):
+	t0=time.time()
+	opcol=OpCollection(heisenberg_opstrs(L))
+	print 'L=',L,'time=',time.time()-t0,'max bond dimension',max(W.shape[-1] for W in opcol.mpo.Ws)
+
+def test_vmps(L=10):
+	engine=VMPSEngine(OpCollection(heisenberg_opstrs(L)).mpo,ket2mps(np.random.rand(2**L),2,L,cano='right'))
+	print engine.run([10,20,30])/L,'(-0.425803520728 from dmrg)'
+
+if __name__=='__main__':
+	test_fsm()
+	test_compress()
+	test_large()
+	test_vmps()
@@ -1,7 +1,11 @@
 import numpy as np
 from scipy.sparse import kron,identity
 
-from mpo import MPO,op2mpo
+from mpo import MPO,op2mpo,add,prod,act,apply
+from mps import ket2mps,overlap
+from vmps import VMPSEngine
+from ops import OpUnit,OpString,OpCollection
+from test import heisenberg_opstrs,mpo2mat,sz,sp
 
 class TestMPO(object):
 	def __init__(self):
@@ -14,6 +18,64 @@ class TestMPO(object):
 		for i in range(6):
 			print self.mpo.Ws[i].shape
 
+	def algebra(self,L=6):
+		'''sum,scalar,product and action on an mps against the dense matrices'''
+		H=OpCollection(heisenberg_opstrs(L)).mpo
+		O=OpCollection([OpString([OpUnit(sz,site=i)],L) for i in range(L)]).mpo
+		Hm,Om=mpo2mat(H),mpo2mat(O)
+		print 'sum',abs(mpo2mat(H+0.5*O)-(Hm+0.5*Om)).max(),'difference',abs(mpo2mat(H-O)-(Hm-Om)).max()
+		print 'product',abs(mpo2mat(H*O)-Hm.dot(Om)).max(),'square',abs(mpo2mat(prod(H,H))-Hm.dot(Hm)).max()
+		ket=np.random.rand(2**L)
+		mps=ket2mps(ket,2,L,cano='right')
+		print 'mpo.mps',abs((H*mps).toket()-Hm.dot(ket)).max()
+		H2=prod(H,H)
+		D=[W.shape[-1] for W in H2.Ws]
+		print 'H^2 bond dimensions',D,'compressed',[W.shape[-1] for W in H2.compress().Ws],'diff',abs(mpo2mat(H2)-Hm.dot(Hm)).max()
+		Z=(H-H).compress()
+		print 'H-H compressed',[W.shape[-1] for W in Z.Ws],'max',abs(mpo2mat(Z)).max()
+
+	def additions(self,L=20):
+		'''terms added one by one keep the bond dimension of the state machine'''
+		opstrs=heisenberg_opstrs(L)
+		opcol=OpCollection(opstrs[:1])
+		for opstr in opstrs[1:]:
+			opcol=opcol+opstr
+		print 'bond dimensions',[W.shape[-1] for W in opcol.mpo.Ws]
+
+	def long_chain(self,L=400):
+		'''compressed mpos of long chains stay normalized and exact,the neel energy is -(L-1)/4 per heisenberg term'''
+		szsz=OpCollection([OpString([OpUnit(sz,site=i),OpUnit(sz,site=i+1)],L) for i in range(L-1)])
+		for opcol,E in [(OpCollection(heisenberg_opstrs(L),compress=True),-0.25*(L-1)),(szsz+OpCollection(heisenberg_opstrs(L)),-0.5*(L-1))]:
+			v=np.ones(1)
+			for i,W in enumerate(opcol.mpo.Ws):
+				v=v.dot(W[:,i%2,i%2,:])
+			print 'max |W|',max(abs(W).max() for W in opcol.mpo.Ws),'neel E-exact',v[0]-E
+
+	def application(self,L=10):
+		'''zip-up and variational mpo.mps against the exact product,and the variance of a ground state'''
+		H=OpCollection(heisenberg_opstrs(L)).mpo
+		Hm=mpo2mat(H)
+		ket=np.random.rand(2**L)
+		mps=ket2mps(ket,2,L,cano='right')
+		mps.contract_s()
+		exact=Hm.dot(ket)
+		for method in ['zipup','variational']:
+			for m in [32,8]:
+				hmps=apply(H,mps,m,method=method)
+				print method,'m=',m,'max bond',max(M.shape[2] for M in hmps.Ms),'|H psi-exact|/|exact|=',np.linalg.norm(hmps.toket()-exact)/np.linalg.norm(exact)
+		engine=VMPSEngine(H,mps)
+		engine.run([10,20,30])
+		for gmps in [engine.mps,mps]:
+			hmps=apply(H,gmps,60,tol=1e-14)
+			norm=overlap(gmps,gmps)
+			E=overlap(gmps,hmps)/norm
+			print 'E=',E,'variance=',overlap(hmps,hmps)/norm-E**2
+		print 'exact variance of the random state',ket.dot(Hm).dot(Hm).dot(ket)/ket.dot(ket)-(ket.dot(Hm).dot(ket)/ket.dot(ket))**2
+
 if __name__=='__main__':
 	tmpo=TestMPO()
 	tmpo.shape()
+	tmpo.algebra()
+	tmpo.additions()
+	tmpo.long_chain()
+	tmpo.application()
@@ -0,0 +1,47 @@
+import time
+import numpy as np
+
+from marker import Marker
+from mpo import MPO
+from mps import MPS
+from vmps import VMPSEngine
+from qnvmps import QNVMPSEngine,tensor_mpo
+from testvmps import heisenberg_mpo
+from test import mpo2mat
+
+site=Marker([1,-1],[1,1],sign=1) #2sz of up,down
+
+class TestQNVMPS(object):
+	def __init__(self,L=10):
+		self.L=L
+		self.Hmpo=heisenberg_mpo(L)
+		self.neel=[0,1]*(L/2)
+
+	def test_mpo(self):
+		Ws=tensor_mpo(self.Hmpo,site)
+		print 'blocks',[len(W.blocks) for W in Ws],'diff',abs(mpo2mat(MPO(2,self.L,[W.toarray() for W in Ws]))-mpo2mat(self.Hmpo)).max()
+
+	def test_ground_state(self):
+		engine=QNVMPSEngine(self.Hmpo,self.neel,site)
+		E=engine.run([10,20,30])
+		print E/self.L,'(-0.425803520728 from dmrg)','bond dimensions',[M.shape[2] for M in engine.Ms]
+
+	def bench(self,L=40,mlist=[20,40,80,120]):
+		'''time per sweep pair of the dense and the block-sparse engine from the same neel state'''
+		Hmpo=heisenberg_mpo(L)
+		neel=[0,1]*(L/2)
+		mps=MPS(2,L)
+		mps.Ms=[np.eye(2)[s].reshape(1,2,1) for s in neel]
+		for name,engine in [('dense',VMPSEngine(Hmpo,mps)),('block-sparse',QNVMPSEngine(Hmpo,neel,site))]:
+			engine.contract()
+			for m in mlist:
+				t0=time.time()
+				engine.right_sweep(m)
+				engine.left_sweep(m)
+				print name,'m=',m,'time=%.2fs'%(time.time()-t0),'E/L=',engine.energys[-1]/L
+
+if __name__=='__main__':
+	tqnvmps=TestQNVMPS()
+	tqnvmps.test_mpo()
+	tqnvmps.test_ground_state()
+	tqnvmps.bench()
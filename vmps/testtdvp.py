@@ -0,0 +1,37 @@
+import numpy as np
+from scipy.linalg import expm
+
+from mps import ket2mps
+from tdvp import TDVPEngine
+from testvmps import heisenberg_mpo
+
+def heisenberg_matrix(L):
+	sp=np.array([[0,1.],[0,0]]);sz=np.array([[1.,0],[0,-1.]])*0.5
+	h=np.kron(sz,sz)+0.5*(np.kron(sp,sp.T)+np.kron(sp.T,sp))
+	return sum(np.kron(np.kron(np.identity(2**i),h),np.identity(2**(L-i-2))) for i in range(L-1))
+
+class TestTDVP(object):
+	def __init__(self,L=8):
+		self.L=L
+		self.Hmpo=heisenberg_mpo(L)
+		self.H=heisenberg_matrix(L)
+
+	def test_quench(self,t=1.,dt=0.1):
+		'''real time evolution of a neel state(two-site) and of a random state(one-site) against the exact one'''
+		neel=np.zeros(2**self.L);neel[int('01'*(self.L/2),2)]=1.
+		ket=np.random.rand(2**self.L);ket/=np.linalg.norm(ket)
+		for nsite,ket in [(2,neel),(1,ket)]:
+			engine=TDVPEngine(self.Hmpo,ket2mps(ket,2,self.L,cano='right'))
+			engine.evolve(1j*dt,int(round(t/dt)),nsite=nsite,m=2**(self.L/2))
+			print 'nsite',nsite,'|psi-psi_exact|=',np.linalg.norm(engine.toket()-expm(-1j*t*self.H).dot(ket))
+
+	def test_ground_state(self):
+		engine=TDVPEngine(self.Hmpo,ket2mps(np.random.rand(2**self.L),2,self.L,cano='right'))
+		for dt,nsteps in [(0.5,40),(0.1,10)]:
+			engine.evolve(dt,nsteps,nsite=2,m=16)
+		print 'E=',engine.energy(),'exact=',np.linalg.eigvalsh(self.H)[0]
+
+if __name__=='__main__':
+	ttdvp=TestTDVP()
+	ttdvp.test_quench()
+	ttdvp.test_ground_state()
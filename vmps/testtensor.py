@@ -1,9 +1,67 @@
 import numpy as np
 
-from tensor import Tensor
+from marker import Marker,blockize
+from tensor import Tensor,from_array,tensordot,svd,qr,eigh
 
-a=np.ones(1,2,2)
-b=np.ones(2,2,4)
+def random_tensor(markers,Q=0):
+	t=from_array(np.random.random([mk.dim for mk in markers]),markers,Q)
+	return t
 
-A=Tensor(a)
-B=tensor(b)
+class TestTensor(object):
+	def __init__(self):
+		self.a=Marker([-1,0,1],[2,3,1],sign=1)
+		self.p=Marker([-1,1],[1,1],sign=1)
+		self.b=Marker([-2,-1,0,1,2],[1,2,4,2,1],sign=-1)
+		self.A=random_tensor([self.a,self.p,self.b])
+		self.B=random_tensor([self.b.flip(),self.p,Marker([-1,0,1],[1,3,2],sign=-1)])
+
+	def test_blockize(self):
+		mk,perm=blockize([0.5,-0.5,-0.5,0.5])
+		print mk.qns,mk.sizes,mk.divs,perm
+
+	def test_toarray(self):
+		print np.abs(from_array(self.A.toarray(),self.A.markers).toarray()-self.A.toarray()).max()
+
+	def test_tensordot(self):
+		C=tensordot(self.A,self.B,axes=([2],[0]))
+		print np.abs(C.toarray()-np.tensordot(self.A.toarray(),self.B.toarray(),axes=([2],[0]))).max()
+
+	def test_transpose(self):
+		print np.abs(self.A.transpose([2,0,1]).toarray()-self.A.toarray().transpose([2,0,1])).max()
+
+	def test_merge(self):
+		M=self.A.merge(0,1)
+		print M.shape,np.abs(M.split(0).toarray()-self.A.toarray()).max()
+		print np.abs(M.split(0).transpose([0,1,2]).toarray()-self.A.toarray()).max()
+
+	def test_svd(self):
+		M=self.A.merge(0,1)
+		U,S,V=svd(M)
+		US=Tensor(U.markers,dict(((q0,q1),u*S[q1]) for (q0,q1),u in U.blocks.items()),U.Q)
+		print np.abs(tensordot(US,V,axes=([1],[0])).toarray()-M.toarray()).max()
+		U,S,V=svd(M,m=3)
+		print sum(len(s) for s in S.values()),U.discarded
+		print np.abs(U.toarray().T.dot(U.toarray())-np.identity(3)).max()
+
+	def test_qr(self):
+		M=self.A.merge(0,1)
+		Q,R=qr(M)
+		print np.abs(tensordot(Q,R,axes=([1],[0])).toarray()-M.toarray()).max()
+
+	def test_eigh(self):
+		M=self.A.merge(0,1)
+		rho=tensordot(M,M.conjugate(),axes=([1],[1]))
+		evals,U=eigh(rho)
+		print sorted(np.concatenate(evals.values()))[-3:]
+		print sorted(np.linalg.eigvalsh(rho.toarray()))[-3:]
+
+if __name__=='__main__':
+	ttensor=TestTensor()
+	ttensor.test_blockize()
+	ttensor.test_toarray()
+	ttensor.test_tensordot()
+	ttensor.test_transpose()
+	ttensor.test_merge()
+	ttensor.test_svd()
+	ttensor.test_qr()
+	ttensor.test_eigh()
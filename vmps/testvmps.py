@@ -1,3 +1,37 @@
 import numpy as np
 
+from mpo import MPO
+from mps import ket2mps
+from vmps import VMPSEngine
+
+def heisenberg_mpo(L,J=1.):
+	sp=np.array([[0,1.],[0,0]])
+	sm=np.array([[0,0],[1.,0]])
+	sz=np.array([[1.,0],[0,-1.]])*0.5
+	I=np.identity(2)
+	W=np.zeros((5,2,2,5))
+	W[0,:,:,0]=I;W[1,:,:,0]=sp;W[2,:,:,0]=sm;W[3,:,:,0]=sz
+	W[4,:,:,1]=J/2*sm;W[4,:,:,2]=J/2*sp;W[4,:,:,3]=J*sz;W[4,:,:,4]=I
+	Ws=[W[4:5]]+[W for i in range(L-2)]+[W[:,:,:,0:1]]
+	return MPO(2,L,Ws)
+
 class TestVMPS(object):
+	def __init__(self,L=10):
+		self.L=L
+		self.Hmpo=heisenberg_mpo(L)
+		self.gmps=ket2mps(np.random.rand(2**L),2,L,cano='right')
+
+	def test_two_site(self):
+		engine=VMPSEngine(self.Hmpo,self.gmps)
+		E=engine.run([10,20,30],nsite=2)
+		print E/self.L,'(-0.425803520728 from dmrg)'
+
+	def test_single_site(self):
+		engine=VMPSEngine(self.Hmpo,self.gmps)
+		E=engine.run([10,20,30,30],nsite=1,alpha=1e-3)
+		print E/self.L,'(-0.425803520728 from dmrg)'
+
+if __name__=='__main__':
+	tvmps=TestVMPS()
+	tvmps.test_two_site()
+	tvmps.test_single_site()
@@ -1,44 +1,197 @@
 import numpy as np
-from scipy.sparse.linalg import eigsh
+from copy import deepcopy
+from scipy.sparse.linalg import eigsh,LinearOperator
+
+from tensor import Tensor,tensordot
+
+'''
+variational mps ground state search
+
+index conventions:mps tensors M[a,s,b],mpo tensors W[w,s,s',w'](s acts on the bra,s' on the ket),
+environments L[a,w,a'] and R[b,w,b'] with the bra index first.
+Ls[i] contains sites 0..i-1,Rs[i] contains sites i..L-1.
+the environment functions work on dense arrays and on block-sparse Tensors(see qnvmps.py) alike.
+'''
+
+def tdot(a,b,axes):
+	'''np.tensordot,or the block-sparse tensordot of two Tensors'''
+	if isinstance(a,Tensor):
+		return tensordot(a,b,axes)
+	return np.tensordot(a,b,axes)
+
+def lupdate(L,A,W,M=None):
+	'''add site tensor A with mpo tensor W to the left environment L,M:the ket tensor if it differs from A'''
+	T=tdot(L,A if M is None else M,axes=(2,0)) #a,w,s',b'
+	T=tdot(T,W,axes=([1,2],[0,2])) #a,b',s,w'
+	T=tdot(A.conjugate(),T,axes=([0,1],[0,2])) #b,b',w'
+	return T.transpose(0,2,1)
+
+def rupdate(R,B,W,M=None):
+	'''add site tensor B with mpo tensor W to the right environment R,M:the ket tensor if it differs from B'''
+	T=tdot(B if M is None else M,R,axes=(2,2)) #a',s',b,w'
+	T=tdot(W,T,axes=([2,3],[1,3])) #w,s,a',b
+	T=tdot(B.conjugate(),T,axes=([1,2],[1,3])) #a,w,a'
+	return T
+
+def heff1(L,W,R,M):
+	'''single-site effective hamiltonian applied to M[a',s',b']'''
+	x=tdot(L,M,axes=(2,0)) #a,w,s',b'
+	x=tdot(x,W,axes=([1,2],[0,2])) #a,b',s,w'
+	return tdot(x,R,axes=([1,3],[2,1])) #a,s,b
+
+def heff2(L,W1,W2,R,theta):
+	'''two-site effective hamiltonian applied to theta[a',s1',s2',b']'''
+	x=tdot(L,theta,axes=(2,0)) #a,w,s1',s2',b'
+	x=tdot(x,W1,axes=([1,2],[0,2])) #a,s2',b',s1,w1
+	x=tdot(x,W2,axes=([4,1],[0,2])) #a,b',s1,s2,w2
+	return tdot(x,R,axes=([1,4],[2,1])) #a,s1,s2,b
+
+def lowest(apply,v0,tol=0.):
+	'''lowest eigenpair of a hermitian operator given as a function on tensors shaped like v0'''
+	n=v0.size
+	if n<=3:
+		H=np.array([apply(v.reshape(v0.shape)).ravel() for v in np.identity(n)]).T
+		E,v=np.linalg.eigh(H)
+	else:
+		op=LinearOperator((n,n),matvec=lambda x:apply(x.reshape(v0.shape)).ravel(),dtype=v0.dtype)
+		E,v=eigsh(op,k=1,which='SA',v0=v0.ravel(),tol=tol)
+	return E[0],v[:,0].reshape(v0.shape)
+
+def svd_truncate(M,m,tol=1e-14,cut=0.,normalize=True):
+	'''
+	svd of a matrix keeping at most m singular values above tol(relative to the largest),fewer if a relative
+	discarded weight up to cut allows.returns U,S(normalized if normalize),Vdag and the discarded weight
+	'''
+	U,S,Vdag=np.linalg.svd(M,full_matrices=False)
+	n=max(1,min(m,np.count_nonzero(S>tol*S[0])))
+	if cut>0.:
+		weights=S**2
+		discarded=weights.sum()-np.cumsum(weights) #discarded weight when keeping 1,2,... states
+		n=min(n,1+np.count_nonzero(discarded>cut*weights.sum()))
+	discarded=np.sum(S[n:]**2)
+	S=S[:n]/np.linalg.norm(S[:n]) if normalize else S[:n]
+	return U[:,:n],S,Vdag[:n],discarded
+
+def right_canonical(Ms):
+	'''right canonical copies of the site tensors,the norm stays in the first one'''
+	Ms=list(Ms)
+	for i in range(len(Ms)-1,0,-1):
+		a,d,b=Ms[i].shape
+		Q,R=np.linalg.qr(Ms[i].reshape(a,d*b).T)
+		Ms[i]=Q.T.reshape(-1,d,b)
+		Ms[i-1]=np.tensordot(Ms[i-1],R.T,axes=(2,0))
+	return Ms
 
 class VMPSEngine(object):
+	'''
+	variational mps engine,two-site and single-site(with subspace expansion) updates
+	construct:VMPSEngine(Hmpo,gmps)
+
+	attributes:
+	Hmpo:hamiltonian mpo
+	Ms:site tensors of the current state,right canonical before a right sweep
+	Ls,Rs:cached left/right environments
+	'''
 	def __init__(self,Hmpo,gmps):
 		self.Hmpo=deepcopy(Hmpo)
 		self.mps=deepcopy(gmps)
-		self.Ls=[]
-		self.Rs=[]
+		self.L=self.Hmpo.L
+		self.d=self.Hmpo.d
+		self.Ls=[None]*(self.L+1)
+		self.Rs=[None]*(self.L+1)
+		self.energys=[]
+		self.errs=[]
+
+	def canonicalize(self): #right canonical form of the initial mps
+		if not hasattr(self.mps,'Ms'):
+			self.mps.contract_s()
+		self.Ms=right_canonical([np.array(M,dtype=np.result_type(M,'d')) for M in self.mps.Ms])
+		self.Ms[0]/=np.linalg.norm(self.Ms[0])
 
 	def contract(self): #calculate Rs
-		self.mps.contract_s() #right canonicalized
-		R=np.array([[[1.]]])
-		for l in range(self.Hmpo.L-2):
-			r=np.tensordot(self.mps.Ms[-l-1].conjugate().transpose(),np.tensordot(self.Hmpo.Ws[-l-1],self.mps.Ms[-l-1],axes=(2,1)),axes=(1,1))
-			R=np.tensordot(r,R,axes=([1,3,5],[0,1,2]))
-			self.Rs.append(R)
-		self.Rs.reverse()
-
-	def right_sweep(self,m):
-		L=np.array([[[1.]]])
-		for l in range(self.Hmpo.L-1):
-			self.H=np.tensordot(L,tensordot(self.Hmpo.Ws[l],np.tensordot(self.Hmpo.Ws[l+1],self.Rs[0],axes=(3,1)),axes=(3,0)),axes=(1,0))
-			self.H.transpose(0,2,4,6,1,3,5,7)
-			self.H.reshape(self.H.shape(0)*self.Hmpo.d**2*self.H.shape[3])
-			lamda,v=eigsh(self.H,1,which='SA') #quantum number 0 block
-			M=v.reshape(-1,self.Hmpo.d*self.Rs[0].shape[2]) #add zero block?
-			self.Rs=self.Rs[1:]
-			U,S,Vdag=np.linalg.svd(M,full_matrices=False)
-			self.mps.Ms[i]=U.reshape(-1,self.Hmpo.d,U.shape[-1]) #blockize?
-			S=S[:m] #renormalize?
-			B=np.tensordot(np.diag(S),Vdag,1)
-			U,S,Vdag=np.linalg.svd(B,fullmatrices=False) #blockize?
-			self.mps.Ms[i+1]=U.reshape(U.shape[0],self.Hmpo.d,-1)
-			self.mps.Ms[i+2]=np.tensordot(np.tensordot(np.diag(S),Vdag,1),self.mps.Ms[i+2],1)
-			l=np.tensordot(self.mps.Ms[i].conjugate().transpose(),np.tensordot(self.Hmpo.Ws[i],self.mps.Ms[i],axes=(2,1),axes=(1,1)))
-			L=np.tensordot(L,l,axes=([0,1,2],[0,2,4]))
-			self.Ls.append(L)
-	
-	def left_sweep(self):
-		R=np.array([[[1.]]])
-		for l in range(self.Hmpo.L-1):
-			
+		self.canonicalize()
+		self.Ls[0]=np.ones((1,1,1))
+		self.Rs[self.L]=np.ones((1,1,1))
+		for i in range(self.L-1,0,-1):
+			self.Rs[i]=rupdate(self.Rs[i+1],self.Ms[i],self.Hmpo.Ws[i])
+
+	def right_sweep(self,m,nsite=2,alpha=0.,tol=0.):
+		'''sweep the orthogonality center from site 0 to site L-1'''
+		Ws=self.Hmpo.Ws
+		if nsite==2:
+			for i in range(self.L-1):
+				theta=np.tensordot(self.Ms[i],self.Ms[i+1],axes=(2,0))
+				E,theta=lowest(lambda x:heff2(self.Ls[i],Ws[i],Ws[i+1],self.Rs[i+2],x),theta,tol)
+				a,d1,d2,b=theta.shape
+				U,S,Vdag,err=svd_truncate(theta.reshape(a*d1,d2*b),m)
+				self.Ms[i]=U.reshape(a,d1,-1)
+				self.Ms[i+1]=(S[:,np.newaxis]*Vdag).reshape(-1,d2,b)
+				self.Ls[i+1]=lupdate(self.Ls[i],self.Ms[i],Ws[i])
+				self.energys.append(E);self.errs.append(err)
+		else:
+			for i in range(self.L):
+				E,M=lowest(lambda x:heff1(self.Ls[i],Ws[i],self.Rs[i+1],x),self.Ms[i],tol)
+				self.energys.append(E)
+				if i==self.L-1:
+					self.Ms[i]=M/np.linalg.norm(M)
+					break
+				a,d,b=M.shape
+				N=self.Ms[i+1]
+				if alpha>0.: #subspace expansion
+					P=np.tensordot(self.Ls[i],M,axes=(2,0))
+					P=np.tensordot(P,Ws[i],axes=([1,2],[0,2])).transpose(0,2,3,1) #a,s,w',b'
+					M=np.concatenate([M,alpha*P.reshape(a,d,-1)],axis=2)
+					N=np.concatenate([N,np.zeros((M.shape[2]-b,)+N.shape[1:],dtype=N.dtype)],axis=0)
+				U,S,Vdag,err=svd_truncate(M.reshape(a*d,-1),m)
+				self.Ms[i]=U.reshape(a,d,-1)
+				self.Ms[i+1]=np.tensordot(S[:,np.newaxis]*Vdag,N,axes=(1,0))
+				self.Ls[i+1]=lupdate(self.Ls[i],self.Ms[i],Ws[i])
+				self.errs.append(err)
+
+	def left_sweep(self,m,nsite=2,alpha=0.,tol=0.):
+		'''sweep the orthogonality center from site L-1 to site 0'''
+		Ws=self.Hmpo.Ws
+		if nsite==2:
+			for i in range(self.L-2,-1,-1):
+				theta=np.tensordot(self.Ms[i],self.Ms[i+1],axes=(2,0))
+				E,theta=lowest(lambda x:heff2(self.Ls[i],Ws[i],Ws[i+1],self.Rs[i+2],x),theta,tol)
+				a,d1,d2,b=theta.shape
+				U,S,Vdag,err=svd_truncate(theta.reshape(a*d1,d2*b),m)
+				self.Ms[i]=(U*S).reshape(a,d1,-1)
+				self.Ms[i+1]=Vdag.reshape(-1,d2,b)
+				self.Rs[i+1]=rupdate(self.Rs[i+2],self.Ms[i+1],Ws[i+1])
+				self.energys.append(E);self.errs.append(err)
+		else:
+			for i in range(self.L-1,-1,-1):
+				E,M=lowest(lambda x:heff1(self.Ls[i],Ws[i],self.Rs[i+1],x),self.Ms[i],tol)
+				self.energys.append(E)
+				if i==0:
+					self.Ms[i]=M/np.linalg.norm(M)
+					break
+				a,d,b=M.shape
+				N=self.Ms[i-1]
+				if alpha>0.: #subspace expansion
+					P=np.tensordot(M,self.Rs[i+1],axes=(2,2)) #a',s',b,w'
+					P=np.tensordot(Ws[i],P,axes=([2,3],[1,3])) #w,s,a',b
+					P=P.transpose(0,2,1,3).reshape(-1,d,b)
+					M=np.concatenate([M,alpha*P],axis=0)
+					N=np.concatenate([N,np.zeros(N.shape[:2]+(M.shape[0]-a,),dtype=N.dtype)],axis=2)
+				U,S,Vdag,err=svd_truncate(M.reshape(M.shape[0],d*b),m)
+				self.Ms[i]=Vdag.reshape(-1,d,b)
+				self.Ms[i-1]=np.tensordot(N,U*S,axes=(2,0))
+				self.Rs[i]=rupdate(self.Rs[i+1],self.Ms[i],Ws[i])
+				self.errs.append(err)
 
+	def run(self,mlist,nsite=2,alpha=1e-4,tol=0.):
+		'''
+		ground state search,one right and one left sweep for every m in mlist
+		alpha:subspace expansion strength for single-site updates
+		'''
+		if self.Rs[1] is None:
+			self.contract()
+		for m in mlist:
+			self.right_sweep(m,nsite,alpha,tol)
+			self.left_sweep(m,nsite,alpha,tol)
+			print 'm=',m,'E=',self.energys[-1]
+		self.mps.Ms=self.Ms
+		return self.energys[-1]